@@ -0,0 +1,366 @@
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from cache import response_cache
+from database import AsyncSessionLocal
+from events import on_write
+from model import Assignment, AssignmentGrade, AssignmentSubmission, Class, ClassGrades, Student
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+load_dotenv("config.env")
+
+logger = logging.getLogger(__name__)
+
+# the grade scale histogram buckets are spread over
+GRADE_MIN = float(os.getenv("GRADE_MIN", "0"))
+GRADE_MAX = float(os.getenv("GRADE_MAX", "10"))
+
+SOURCES = ("class_grades", "assignment_grade")
+DIMENSIONS = ("class", "subject", "teacher", "semester")
+DEFAULT_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+MAX_BINS = 100
+MAX_PERCENTILES = 20
+# after a write, the previous snapshot is served while a new one loads, for at most this long
+ANALYTICS_MAX_STALE = float(os.getenv("ANALYTICS_MAX_STALE", "300"))
+# response cache tag of the analytics routes, dropped when a snapshot is reloaded
+ANALYTICS_TAG = "grade_analytics"
+
+# the tables each source's (grade, group) rows are read from
+SOURCE_TABLES = {
+    "class_grades": {"class_grades", "class", "student"},
+    "assignment_grade": {"assignment_grade", "assignment_submission", "assignment", "class", "student"},
+}
+
+
+def grade_values(source: str, by: str, group_id: Any = None) -> Select:
+    # (grade, group) for every grade of the source, the group being the dimension's key
+    if source == "class_grades":
+        statement = select(ClassGrades.grade.label("grade")).select_from(ClassGrades)
+        class_id, student_id = ClassGrades.class_id, ClassGrades.student_id
+    else:
+        statement = (
+            select(AssignmentGrade.grade.label("grade"))
+            .select_from(AssignmentGrade)
+            .join(AssignmentSubmission, AssignmentSubmission.id == AssignmentGrade.submission_id)
+            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+        )
+        class_id, student_id = Assignment.class_id, AssignmentSubmission.student_id
+    if by == "class":
+        group = class_id
+    elif by == "semester":
+        statement = statement.join(Student, Student.id == student_id)
+        group = Student.semester
+    else:
+        statement = statement.join(Class, Class.id == class_id)
+        group = Class.subject_id if by == "subject" else Class.teacher_id
+    if group_id is not None:
+        statement = statement.where(group == group_id)
+    return statement.add_columns(group.label("group"))
+
+
+def bin_edges(bins: int) -> List[float]:
+    width = (GRADE_MAX - GRADE_MIN) / bins
+    return [GRADE_MIN + width * i for i in range(bins)] + [GRADE_MAX]
+
+
+def summary_statement(values: Select, edges: Sequence[float], percentiles: Sequence[float]) -> Select:
+    # the whole distribution of every group in one PostgreSQL statement;
+    # grades outside the scale fall into the first or last bucket
+    base = values.subquery()
+    grade = base.c.grade
+    buckets = []
+    for i in range(len(edges) - 1):
+        conditions = []
+        if i > 0:
+            conditions.append(grade >= edges[i])
+        if i < len(edges) - 2:
+            conditions.append(grade < edges[i + 1])
+        buckets.append(func.sum(case((and_(*conditions), 1), else_=0)) if conditions else func.count(grade))
+    return (
+        select(
+            base.c.group,
+            func.count(grade),
+            func.avg(grade),
+            func.stddev_samp(grade),
+            func.min(grade),
+            func.max(grade),
+            *[func.percentile_cont(p).within_group(grade) for p in percentiles],
+            *buckets,
+        )
+        .group_by(base.c.group)
+        .order_by(base.c.group)
+    )
+
+
+class Distribution(NamedTuple):
+    group: Any
+    count: int
+    mean: float
+    stddev: Optional[float]
+    min: float
+    max: float
+    percentiles: List[float]
+    histogram: List[int]
+
+
+class GradeSnapshot(NamedTuple):
+    # group keys in order, and every group's grades sorted in grades[bounds[i]:bounds[i + 1]];
+    # numpy arrays when numpy is installed, lists otherwise
+    keys: List[Any]
+    bounds: Any
+    grades: Any
+
+
+def _snapshot_numpy(rows: Sequence[Tuple[float, Any]]) -> GradeSnapshot:
+    # integer keys, or strings for semesters; both sort natively in numpy
+    groups = np.array([group for _, group in rows])
+    grades = np.fromiter((grade for grade, _ in rows), dtype=np.float64, count=len(rows))
+    keys, codes = np.unique(groups, return_inverse=True)
+    codes = codes.reshape(-1)
+    order = np.lexsort((grades, codes))
+    counts = np.bincount(codes, minlength=len(keys))
+    return GradeSnapshot(keys.tolist(), np.concatenate(([0], np.cumsum(counts))), grades[order])
+
+
+def _snapshot_python(rows: Sequence[Tuple[float, Any]]) -> GradeSnapshot:
+    by_group: Dict[Any, List[float]] = {}
+    for grade, group in rows:
+        by_group.setdefault(group, []).append(grade)
+    keys = sorted(by_group)
+    bounds, grades = [0], []
+    for key in keys:
+        grades.extend(sorted(by_group[key]))
+        bounds.append(len(grades))
+    return GradeSnapshot(keys, bounds, grades)
+
+
+def build_snapshot(rows: Sequence[Tuple[float, Any]]) -> GradeSnapshot:
+    if np is None or not rows:
+        return _snapshot_python(rows)
+    return _snapshot_numpy(rows)
+
+
+def _select(snapshot: GradeSnapshot, group_id: Any) -> GradeSnapshot:
+    if group_id is None:
+        return snapshot
+    i = bisect_left(snapshot.keys, group_id)
+    if i == len(snapshot.keys) or snapshot.keys[i] != group_id:
+        return GradeSnapshot([], [0], snapshot.grades[:0])
+    start, end = snapshot.bounds[i], snapshot.bounds[i + 1]
+    return GradeSnapshot([group_id], [0, end - start], snapshot.grades[start:end])
+
+
+def _distributions_numpy(
+    snapshot: GradeSnapshot, edges: Sequence[float], percentiles: Sequence[float]
+) -> List[Distribution]:
+    bounds, grades = np.asarray(snapshot.bounds), snapshot.grades
+    starts, counts = bounds[:-1], np.diff(bounds)
+    codes = np.repeat(np.arange(len(counts)), counts)
+    means = np.add.reduceat(grades, starts) / counts
+    deviations = np.add.reduceat((grades - means[codes]) ** 2, starts)
+    stddevs = np.sqrt(deviations / np.maximum(counts - 1, 1))
+    # linear interpolation between the closest ranks, as percentile_cont does
+    quantiles = []
+    for p in percentiles:
+        position = p * (counts - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        below, above = grades[starts + low], grades[starts + high]
+        quantiles.append(below + (above - below) * (position - low))
+    bins = len(edges) - 1
+    buckets = np.searchsorted(np.asarray(edges[1:-1]), grades, side="right")
+    histograms = np.bincount(codes * bins + buckets, minlength=len(counts) * bins).reshape(-1, bins)
+    return [
+        Distribution(key, count, mean, stddev if count > 1 else None, low, high, group_quantiles, histogram)
+        for key, count, mean, stddev, low, high, group_quantiles, histogram in zip(
+            snapshot.keys,
+            counts.tolist(),
+            means.tolist(),
+            stddevs.tolist(),
+            grades[starts].tolist(),
+            grades[bounds[1:] - 1].tolist(),
+            np.array(quantiles).T.tolist(),
+            histograms.tolist(),
+        )
+    ]
+
+
+def _distributions_python(
+    snapshot: GradeSnapshot, edges: Sequence[float], percentiles: Sequence[float]
+) -> List[Distribution]:
+    distributions = []
+    inner = edges[1:-1]
+    for i, key in enumerate(snapshot.keys):
+        grades = snapshot.grades[snapshot.bounds[i]:snapshot.bounds[i + 1]]
+        count = len(grades)
+        mean = sum(grades) / count
+        stddev = math.sqrt(sum((grade - mean) ** 2 for grade in grades) / (count - 1)) if count > 1 else None
+        quantiles = []
+        for p in percentiles:
+            position = p * (count - 1)
+            low, high = math.floor(position), math.ceil(position)
+            quantiles.append(grades[low] + (grades[high] - grades[low]) * (position - low))
+        histogram = [0] * (len(edges) - 1)
+        for grade in grades:
+            histogram[bisect_right(inner, grade)] += 1
+        distributions.append(Distribution(key, count, mean, stddev, grades[0], grades[-1], quantiles, histogram))
+    return distributions
+
+
+def distributions(
+    snapshot: GradeSnapshot, edges: Sequence[float], percentiles: Sequence[float], group_id: Any = None
+) -> List[Distribution]:
+    snapshot = _select(snapshot, group_id)
+    if not snapshot.keys:
+        return []
+    if np is None:
+        return _distributions_python(snapshot, edges, percentiles)
+    return _distributions_numpy(snapshot, edges, percentiles)
+
+
+class _Entry(NamedTuple):
+    snapshot: GradeSnapshot
+    generation: int
+    loaded_at: float
+
+
+class SnapshotCache:
+    # one snapshot per (source, dimension), so any group, bins and percentiles are
+    # answered without reading the grades again; a write to a table it reads makes it stale
+    def __init__(self, sessionmaker: async_sessionmaker = AsyncSessionLocal, max_stale: float = ANALYTICS_MAX_STALE):
+        self.sessionmaker = sessionmaker
+        self.max_stale = max_stale
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._generations: Dict[str, int] = {}
+        self._loading: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, source: str, by: str) -> _Entry:
+        key = (source, by)
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generations.get(source, 0)
+        if entry is not None and entry.generation == generation:
+            return entry
+        if entry is not None and time.time() - entry.loaded_at < self.max_stale:
+            self._load(key)
+            return entry
+        return await self._load(key)
+
+    def _load(self, key: Tuple[str, str]) -> asyncio.Task:
+        # concurrent requests share one load
+        loop = asyncio.get_running_loop()
+        task = self._loading.get(key)
+        if task is None or task.done() or task.get_loop() is not loop:
+            # an empty context keeps the load, which may outlive the request, out of its query count
+            task = contextvars.Context().run(loop.create_task, self._read(key))
+            task.add_done_callback(self._loaded)
+            self._loading[key] = task
+        return task
+
+    def _loaded(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("loading a grade snapshot failed", exc_info=task.exception())
+
+    async def _read(self, key: Tuple[str, str]) -> _Entry:
+        source, by = key
+        with self._lock:
+            generation = self._generations.get(source, 0)
+        loaded_at = time.time()
+        async with self.sessionmaker() as session:
+            rows = (await session.execute(grade_values(source, by))).all()
+        entry = _Entry(await run_in_threadpool(build_snapshot, rows), generation, loaded_at)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is None or previous.generation <= generation:
+                self._entries[key] = entry
+        if previous is not None:
+            # responses built from the stale snapshot
+            response_cache.invalidate(ANALYTICS_TAG)
+        return entry
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            for source, tables in SOURCE_TABLES.items():
+                if table in tables:
+                    self._generations[source] = self._generations.get(source, 0) + 1
+
+
+grade_snapshots = SnapshotCache()
+
+
+@on_write
+def _invalidate_snapshots(model, rows) -> None:
+    grade_snapshots.invalidate(model.__tablename__)
+
+
+async def grade_distribution(
+    session: AsyncSession, source: str, by: str, group: Optional[str] = None,
+    bins: int = 10, percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> dict:
+    if source not in SOURCES:
+        raise HTTPException(status_code=404, detail=f"source must be one of {', '.join(SOURCES)}")
+    if any(not 0 <= p <= 1 for p in percentiles):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 1")
+    group_id: Any = group
+    if group is not None and by != "semester":
+        try:
+            group_id = int(group)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"'group' must be a {by} id")
+    # the median is always reported
+    percentiles = sorted(set(percentiles) | {0.5})
+    edges = bin_edges(bins)
+
+    as_of = time.time()
+    if session.get_bind().dialect.name == "postgresql":
+        rows = (await session.execute(summary_statement(grade_values(source, by, group_id), edges, percentiles))).all()
+        n = len(percentiles)
+        data = [
+            Distribution(row[0], row[1], row[2], row[3], row[4], row[5], list(row[6:6 + n]), list(row[6 + n:]))
+            for row in rows
+        ]
+    else:
+        # no percentile_cont; the grades are read once per dimension and ranked in memory
+        entry = await grade_snapshots.get(source, by)
+        as_of = entry.loaded_at
+        data = await run_in_threadpool(distributions, entry.snapshot, edges, percentiles, group_id)
+
+    return {
+        "source": source,
+        "by": by,
+        "as_of": datetime.fromtimestamp(as_of, timezone.utc),
+        "bins": [{"from": edges[i], "to": edges[i + 1]} for i in range(bins)],
+        "data": [
+            {
+                "group": row.group,
+                "count": row.count,
+                "mean": row.mean,
+                "stddev": row.stddev,
+                "min": row.min,
+                "max": row.max,
+                "median": row.percentiles[percentiles.index(0.5)],
+                "percentiles": {f"p{p * 100:g}": value for p, value in zip(percentiles, row.percentiles)},
+                "histogram": row.histogram,
+            }
+            for row in data
+        ],
+    }
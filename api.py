@@ -1,42 +1,121 @@
 import os
 from datetime import datetime
-from dotenv import load_dotenv
-from fastapi import Depends, FastAPI
-from fastapi_crudrouter import SQLAlchemyCRUDRouter as CRUDRouter
-from sqlalchemy import Extract, create_engine
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from sqlmodel import SQLModel
+from analytics import DEFAULT_PERCENTILES, DIMENSIONS, MAX_BINS, MAX_PERCENTILES, grade_distribution
+from assignments import FEED_KEYS, STATUSES, assignment_feed
+from bulk import UpsertSpec, bulk_upsert, iterate_rows, upsert_rows
+from cache import ResponseCacheMiddleware, cached_routes, response_cache
+from counts import count_rows
+from crud import CRUDRouter
+from dashboard import DASHBOARD_QUERIES, teacher_dashboard
+from database import READ_REPLICA_STICKY_SECONDS, AsyncSessionLocal, async_engine, engine, get_async_session, get_session, replica_pool, routed_session
+from enrollment import enroll, reserve_bulk_seats, unenroll
+from events import notify_write
+from export import MEDIA_TYPES, MODELS, export_columns, export_statement, get_model, stream_export
+from files import save_upload, submission_file_response
+from filters import ListQuery, SubmissionDateRange, list_query, student_filters
+from grades import CLASS_GRADES_SPEC
+from instrumentation import InstrumentationMiddleware, QueryBudget, instrument, metrics
+from jobs import JOB_FILES_DIR, STATUSES as JOB_STATUSES, SUCCEEDED, JobError, get_job, job_handler, job_queue, job_status
+from pagination import PageParams, SortKey, paginate
+from replicas import StickyPrimaryMiddleware, wants_primary
+from responses import fast_page, group_rows, shape_columns, shape_row
+from search import student_search
+from slowlog import SORT_KEYS, slow_query_log
+from summary import load_student_summaries
 from model import (
     Student,
     StudentPublic,
+    ClassPublic,
+    SubjectPublic,
     Teacher,
     Subject,
     Class,
     Assignment,
+    AssignmentCreate,
     AssignmentSubmission,
+    AssignmentSubmissionPublic,
+    AssignmentSubmissionCreate,
     AssignmentGrade,
     Enrollment,
     ClassGrades,
+    ClassCreate,
+    EnrollmentCreate,
+    AssignmentGradeCreate,
+    Job,
+    JobCreate,
 )
 
-load_dotenv("config.env")
-engine = create_engine(os.getenv("DATABASE_URL"), echo=False)
 SQLModel.metadata.create_all(engine)
 
-def get_session() -> Session:
-    return Session(engine)
+
+BULK_SPECS = {
+    "enrollment": UpsertSpec(Enrollment, EnrollmentCreate, key=("student_id", "class_id"), upsert=False, prepare=reserve_bulk_seats),
+    "class_grades": CLASS_GRADES_SPEC,
+    "assignment_grade": UpsertSpec(AssignmentGrade, AssignmentGradeCreate, key=("submission_id",), update=("grade",)),
+}
+
+
+@job_handler("bulk_upsert")
+async def bulk_upsert_job(payload: dict) -> dict:
+    # {"model": "class_grades", "rows": [...]}, the same rows the /<model>/bulk endpoints take
+    spec = BULK_SPECS.get(payload.get("model"))
+    if spec is None:
+        raise JobError(f"model must be one of {', '.join(BULK_SPECS)}")
+    if not isinstance(payload.get("rows"), list):
+        raise JobError("'rows' must be a list")
+    async with AsyncSessionLocal() as session:
+        return await upsert_rows(session, iterate_rows(payload["rows"]), spec)
 
 
 app = FastAPI()
+app.add_middleware(StickyPrimaryMiddleware, seconds=READ_REPLICA_STICKY_SECONDS if replica_pool.replicas else 0)
+app.add_middleware(
+    ResponseCacheMiddleware,
+    backend=response_cache,
+    routes=cached_routes(MODELS),
+    # clients pinned to the primary must see their own writes, which a cached response may predate
+    bypass=wants_primary if replica_pool.replicas else None,
+    replica_lag=READ_REPLICA_STICKY_SECONDS,
+)
+# outermost, so cache hits are timed and counted as well
+app.add_middleware(InstrumentationMiddleware, routes=app.routes)
+instrument(engine, async_engine.sync_engine)
+for replica in replica_pool.replicas:
+    instrument(replica.engine, replica.async_engine.sync_engine)
+if slow_query_log is not None:
+    slow_query_log.install(engine, async_engine, *(replica.async_engine for replica in replica_pool.replicas))
 
 student_router = CRUDRouter(schema=Student, db_model=Student, db=get_session)
 teaher_router = CRUDRouter(schema=Teacher, db_model=Teacher, db=get_session)
 subject_router = CRUDRouter(schema=Subject, db_model=Subject, db=get_session)
-class_router = CRUDRouter(schema=Class, db_model=Class, db=get_session)
-assignment_router = CRUDRouter(schema=Assignment, db_model=Assignment, db=get_session)
-assignment_submission_router = CRUDRouter(schema=AssignmentSubmission, db_model=AssignmentSubmission, db=get_session)
+class_router = CRUDRouter(schema=Class, create_schema=ClassCreate, update_schema=ClassCreate, db_model=Class, db=get_session)
+assignment_router = CRUDRouter(schema=Assignment, create_schema=AssignmentCreate, update_schema=AssignmentCreate, db_model=Assignment, db=get_session)
+assignment_submission_router = CRUDRouter(
+    schema=AssignmentSubmissionPublic,
+    create_schema=AssignmentSubmissionCreate,
+    update_schema=AssignmentSubmissionCreate,
+    db_model=AssignmentSubmission,
+    db=get_session,
+)
 assignment_grade_router = CRUDRouter(schema=AssignmentGrade, db_model=AssignmentGrade, db=get_session)
-enrollment_router = CRUDRouter(schema=Enrollment, db_model=Enrollment, db=get_session)
+# writes go through enrollment.py so class.enrolled_count stays in step
+enrollment_router = CRUDRouter(
+    schema=Enrollment,
+    db_model=Enrollment,
+    db=get_session,
+    create_route=False,
+    update_route=False,
+    delete_one_route=False,
+    delete_all_route=False,
+)
 class_grades_router = CRUDRouter(schema=ClassGrades, db_model=ClassGrades, db=get_session)
 
 app.include_router(student_router)
@@ -50,387 +129,350 @@ app.include_router(enrollment_router)
 app.include_router(class_grades_router)
 
 
+@app.on_event("startup")
+async def start_background_tasks():
+    replica_pool.start()
+    job_queue.start()
+
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    await job_queue.stop()
+    await replica_pool.close()
+    await async_engine.dispose()
+    engine.dispose()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
+
+
+@app.get("/admin/slow_queries", tags=["Admin"])
+async def get_slow_queries(sort: str = "total_ms", limit: int = 20):
+    if slow_query_log is None:
+        raise HTTPException(status_code=404, detail="the slow query log is disabled")
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_KEYS)}")
+    return {"data": await run_in_threadpool(slow_query_log.aggregate, sort, limit)}
+
+
+@app.get("/admin/replicas", tags=["Admin"])
+async def get_replicas():
+    return {"strategy": replica_pool.strategy, "data": replica_pool.status()}
+
+
 @app.get("/student_qtd", tags=["Student"])
-def get_student_qtd(session: Session = Depends(get_session)):
+async def get_student_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Student).count()
+        qtd = await count_rows(session, select(Student), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/teacher_qtd", tags=["Teacher"])
-def get_teacher_qtd(session: Session = Depends(get_session)):
+async def get_teacher_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Teacher).count()
+        qtd = await count_rows(session, select(Teacher), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/subject_qtd", tags=["Subject"])
-def get_subject_qtd(session: Session = Depends(get_session)):
+async def get_subject_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Subject).count()
+        qtd = await count_rows(session, select(Subject), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/class_qtd", tags=["Class"])
-def get_class_qtd(session: Session = Depends(get_session)):
+async def get_class_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Class).count()
+        qtd = await count_rows(session, select(Class), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/assignment_qtd", tags=["Assignment"])
-def get_assignment_qtd(session: Session = Depends(get_session)):
+async def get_assignment_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Assignment).count()
+        qtd = await count_rows(session, select(Assignment), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
-@app.get("submission_qtd", tags=["Assignment_submission"])
-def get_qtd(session: Session = Depends(get_session)):
+@app.get("/submission_qtd", tags=["Assignment_submission"])
+async def get_submission_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Student).count()
-        return  {"quantidade": qtd}
+        qtd = await count_rows(session, select(AssignmentSubmission), estimate=estimate)
+        return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/grade_qtd", tags=["Assignment_grade"])
-def get_grade_qtd(session: Session = Depends(get_session)):
+async def get_grade_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(AssignmentGrade).count()
+        qtd = await count_rows(session, select(AssignmentGrade), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/enrollment_qtd", tags=["Enrollment"])
-def get_enrollment_qtd(session: Session = Depends(get_session)):
+async def get_enrollment_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(Enrollment).count()
+        qtd = await count_rows(session, select(Enrollment), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/class_grades_qtd", tags=["Class_grades"])
-def get_class_grades_qtd(session: Session = Depends(get_session)):
+async def get_class_grades_qtd(estimate: bool = False, session: AsyncSession = Depends(get_async_session)):
     try:
-        qtd = session.query(ClassGrades).count()
+        qtd = await count_rows(session, select(ClassGrades), estimate=estimate)
         return {"quantidade": qtd}
     except Exception as e:
         return {"error": str(e)}
 
+async def classes_by_student(session: AsyncSession, student_ids: List[int]) -> dict:
+    # StudentPublic.classes for a page of students in one query, shaped like ClassPublic
+    return group_rows(await session.execute(
+        select(Enrollment.student_id, *shape_columns(Class, ClassPublic, subject=(Subject, SubjectPublic)))
+        .join(Class, Class.id == Enrollment.class_id)
+        .join(Subject)
+        .where(Enrollment.student_id.in_(student_ids))
+    ), "student_id")
+
 @app.get("/student_page", tags=["Student"])
-def get_student_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Student).count()
-    students = session.query(Student).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": students,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_student_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Student)), fast: bool = False, session: AsyncSession = Depends(get_async_session)):
+    if fast:
+        result = await paginate(session, query.select(shape_columns(Student, StudentPublic)), params, keys=query.keys)
+        students = [shape_row(row) for row in result["data"]]
+        classes = await classes_by_student(session, [student["id"] for student in students])
+        result["data"] = [dict(student, classes=classes.get(student["id"], [])) for student in students]
+        return fast_page(result)
+    return await query.page(session, params)
 
 @app.get("/teacher_page", tags=["Teacher"])
-def get_teacher_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Teacher).count()
-    teachers = session.query(Teacher).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": teachers,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_teacher_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Teacher)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/subject_page", tags=["Subject"])    
-def get_subject_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Subject).count()
-    subjects = session.query(Subject).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": subjects,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_subject_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Subject)), fast: bool = False, session: AsyncSession = Depends(get_async_session)):
+    if fast:
+        return fast_page(await paginate(session, query.select(shape_columns(Subject, SubjectPublic)), params, keys=query.keys))
+    return await query.page(session, params)
     
 @app.get("/class_page", tags=["Class"])
-def get_class_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Class).count()
-    classes = session.query(Class).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": classes,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_class_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Class)), fast: bool = False, session: AsyncSession = Depends(get_async_session)):
+    if fast:
+        statement = query.select(shape_columns(Class, ClassPublic, subject=(Subject, SubjectPublic))).join(Subject)
+        return fast_page(await paginate(session, statement, params, keys=query.keys))
+    return await query.page(session, params)
     
 @app.get("/assignment_page", tags=["Assignment"])
-def get_assignment_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Assignment).count()
-    assignments = session.query(Assignment).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": assignments,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_assignment_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Assignment)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/submission_page", tags=["Assignment_submission"])
-def get_submission_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(AssignmentSubmission).count()
-    submissions = session.query(AssignmentSubmission).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": submissions,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_submission_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(AssignmentSubmission)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/grade_page", tags=["Assignment_grade"])
-def get_grade_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(AssignmentGrade).count()
-    grades = session.query(AssignmentGrade).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": grades,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_grade_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(AssignmentGrade)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/enrollment_page", tags=["Enrollment"])
-def get_enrollment_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Enrollment).count()
-    enrollments = session.query(Enrollment).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": enrollments,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_enrollment_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(Enrollment)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/class_grades_page", tags=["Class_grades"])
-def get_class_grades_page(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(ClassGrades).count()
-    class_grades = session.query(ClassGrades).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": class_grades,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_class_grades_page(params: PageParams = Depends(), query: ListQuery = Depends(list_query(ClassGrades)), session: AsyncSession = Depends(get_async_session)):
+    return await query.page(session, params)
     
 @app.get("/student/{student_id}/classes", tags=["Student"])
-def get_classes_by_student(student_id: int, page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Class).join(Enrollment).where(Enrollment.student_id == student_id).count()
-    classes = session.query(Class).join(Enrollment).where(Enrollment.student_id == student_id).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": classes,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_classes_by_student(student_id: int, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = select(Class).join(Enrollment).where(Enrollment.student_id == student_id)
+    return await paginate(session, query, params, keys=[Class.id])
 
 @app.get("/student/{student_id}/assignments", tags=["Student"])
-def get_assignments_by_student(student_id: int, page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Assignment).join(AssignmentSubmission, Assignment.id == AssignmentSubmission.assignment_id).join(Enrollment, Assignment.class_id == Enrollment.class_id and AssignmentSubmission.student_id == Enrollment.student_id).where(Enrollment.student_id == student_id).count()
-    assignments = session.query(Assignment).join(AssignmentSubmission, Assignment.id == AssignmentSubmission.assignment_id).join(Enrollment, Assignment.class_id == Enrollment.class_id and AssignmentSubmission.student_id == Enrollment.student_id).where(Enrollment.student_id == student_id).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": assignments,
-        "pagination": {
-            "total_pages": total_pages,            
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_assignments_by_student(student_id: int, status: Optional[str] = Query(None, regex=f"^({'|'.join(STATUSES)})$"), params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    result = await paginate(session, assignment_feed(student_id, status), params, keys=FEED_KEYS)
+    result["data"] = [dict(row._mapping) for row in result["data"]]
+    return result
     
+@app.get("/teacher/{teacher_id}/dashboard", tags=["Teacher"], dependencies=[Depends(QueryBudget(DASHBOARD_QUERIES))])
+async def get_teacher_dashboard(teacher_id: int, class_id: Optional[int] = None, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    return await teacher_dashboard(session, teacher_id, params, class_id)
+
+@app.get("/analytics/grades/{source}", tags=["Analytics"], dependencies=[Depends(QueryBudget(1))])
+async def get_grade_analytics(source: str, by: str = Query("class", regex=f"^({'|'.join(DIMENSIONS)})$"), group: Optional[str] = None, bins: int = Query(10, ge=1, le=MAX_BINS), percentile: List[float] = Query(list(DEFAULT_PERCENTILES), max_items=MAX_PERCENTILES), session: AsyncSession = Depends(get_async_session)):
+    # source is class_grades or assignment_grade; one entry per class, subject, teacher or semester
+    return await grade_distribution(session, source, by, group, bins, percentile)
+
 @app.get("/student_search", tags=["Student"])
-def get_student_search(q: str, page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Student).filter(Student.name.ilike(f"%{q}%")).count()
-    student = session.query(Student).filter(Student.name.ilike(f"%{q}%")).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": student,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
+async def get_student_search(q: str, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query, keys = student_search(session.get_bind().dialect.name, q)
+    return await paginate(session, query, params, keys=keys)
 
     
 @app.get("/submission_year", tags=["Assignment_submission"])
-def get_submission_year(year: int, page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(AssignmentSubmission).filter(Extract('year', AssignmentSubmission.submission_date) == year).count()
-    submissions = session.query(AssignmentSubmission).filter(Extract('year', AssignmentSubmission.submission_date) == year).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": submissions,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
-
-@app.get("/student/{student_id}/workload", tags=["Student"])
-def get_workload_by_student(student_id: int, page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Class).join(Enrollment).where(Enrollment.student_id == student_id).count()
-    classes = session.query(Class).join(Enrollment).where(Enrollment.student_id == student_id).limit(limit).offset(page*limit).all()
-    workload = sum([c.subject.workload for c in classes])
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data" : classes,
-        "pagination": {
-            "carga_horária": f"{workload}H",
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
-
-@app.get("/students_sorted", tags=["Student"])
-def get_students_sorted(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Student).count()
-    students = session.query(Student).order_by(Student.name).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": students,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
-
-@app.get("/students_sorted_desc", tags=["Student"])
-def get_students_sorted_desc(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Student).count()
-    students = session.query(Student).order_by(Student.name.desc()).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": students,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
-
-@app.get("/students_with_classes", tags=["Student"])
-def get_students_with_classes(page: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    total = session.query(Student).count()
-    students = session.query(Student).limit(limit).offset(page*limit).all()
-    students_with_classes = []
-    for student in students:
-        classes = session.query(Class).join(Enrollment).where(Enrollment.student_id == student.id).all()
-        students_with_classes.append(StudentPublic(**student.dict(), classes=classes))
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": students_with_classes,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
-
-@app.get("/students_filtered", tags=["Student"])
-def get_students_filtered(page: int = 0, limit: int = 10, name: str = "", age: int = 0, semester: str = "", session: Session = Depends(get_session)):
-    total = session.query(Student).count()
-    students = session.query(Student).filter(Student.name.like(f"%{name}%")).filter(Student.age == age).filter(Student.semester == semester).limit(limit).offset(page*limit).all()
-    current_page = (page // limit) + 1
-    total_pages = (total // limit) + 1
-    return {
-        "data": students,
-        "pagination": {
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total": total,
-            "offset": page,
-            "limit": limit
-        }
-    }
\ No newline at end of file
+async def get_submission_year(dates: SubmissionDateRange = Depends(), params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    if not dates.is_set:
+        raise HTTPException(status_code=400, detail="give 'year' or a 'from'/'to' range")
+    query = select(AssignmentSubmission).where(*dates.filters())
+    return await paginate(session, query, params, keys=[AssignmentSubmission.id])
+
+@app.get("/student/{student_id}/workload", tags=["Student"], dependencies=[Depends(QueryBudget(3))])
+async def get_workload_by_student(student_id: int, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = select(Class).join(Enrollment).where(Enrollment.student_id == student_id).options(joinedload(Class.subject))
+    result = await paginate(session, query, params, keys=[Class.id])
+    summaries = await load_student_summaries(session, [student_id])
+    workload = summaries[0]["total_workload"] if summaries else 0
+    result["pagination"]["carga_horária"] = f"{workload}H"
+    return result
+
+@app.get("/student/{student_id}/summary", tags=["Student"])
+async def get_student_summary(student_id: int, session: AsyncSession = Depends(get_async_session)):
+    summaries = await load_student_summaries(session, [student_id])
+    if not summaries:
+        raise HTTPException(status_code=404, detail="student not found")
+    return summaries[0]
+
+@app.get("/students/summary", tags=["Student"])
+async def get_students_summary(ids: List[int] = Query(..., max_items=1000), session: AsyncSession = Depends(get_async_session)):
+    return {"data": await load_student_summaries(session, ids)}
+
+# superseded by /student_page?sort=name and ?sort=-name
+@app.get("/students_sorted", tags=["Student"], deprecated=True)
+async def get_students_sorted(params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    return await paginate(session, select(Student), params, keys=[Student.name, Student.id])
+
+@app.get("/students_sorted_desc", tags=["Student"], deprecated=True)
+async def get_students_sorted_desc(params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    keys = [SortKey(Student.name, descending=True), SortKey(Student.id, descending=True)]
+    return await paginate(session, select(Student), params, keys=keys)
+
+@app.get("/students_with_classes", tags=["Student"], dependencies=[Depends(QueryBudget(3))])
+async def get_students_with_classes(params: PageParams = Depends(), fast: bool = False, session: AsyncSession = Depends(get_async_session)):
+    if fast:
+        result = await paginate(session, select(*shape_columns(Student, StudentPublic)), params, keys=[Student.id])
+        students = [shape_row(row) for row in result["data"]]
+        classes = await classes_by_student(session, [student["id"] for student in students])
+        result["data"] = [dict(student, classes=classes.get(student["id"], [])) for student in students]
+        return fast_page(result)
+    query = select(Student).options(selectinload(Student.classes).joinedload(Class.subject))
+    result = await paginate(session, query, params, keys=[Student.id])
+    result["data"] = [StudentPublic(**student.dict(), classes=student.classes) for student in result["data"]]
+    return result
+
+# superseded by /student_page?filter[name][prefix]=...&filter[age]=...
+@app.get("/students_filtered", tags=["Student"], deprecated=True)
+async def get_students_filtered(name: Optional[str] = None, age: Optional[int] = None, semester: Optional[str] = None, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = select(Student).where(*student_filters(name, age, semester))
+    return await paginate(session, query, params, keys=[Student.id])
+
+@app.post("/enrollment", tags=["Enrollment"])
+async def create_enrollment(enrollment: EnrollmentCreate, session: AsyncSession = Depends(get_async_session)):
+    return await enroll(session, enrollment.student_id, enrollment.class_id)
+
+@app.delete("/enrollment/{student_id}/{class_id}", tags=["Enrollment"])
+async def delete_enrollment(student_id: int, class_id: int, session: AsyncSession = Depends(get_async_session)):
+    await unenroll(session, student_id, class_id)
+    return {"student_id": student_id, "class_id": class_id}
+
+@app.get("/class/{class_id}/roster", tags=["Class"], dependencies=[Depends(QueryBudget(3))])
+async def get_class_roster(class_id: int, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    class_ = await session.get(Class, class_id)
+    if class_ is None:
+        raise HTTPException(status_code=404, detail="class not found")
+    query = select(Student).join(Enrollment, Enrollment.student_id == Student.id).where(Enrollment.class_id == class_id)
+    result = await paginate(session, query, params, keys=[Student.id])
+    result["class"] = {"id": class_.id, "student_limit": class_.student_limit, "enrolled_count": class_.enrolled_count}
+    return result
+
+@app.post("/enrollment/bulk", tags=["Enrollment"])
+async def bulk_enrollment(request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await bulk_upsert(session, request, BULK_SPECS["enrollment"])
+
+@app.post("/class_grades/bulk", tags=["Class_grades"])
+async def bulk_class_grades(request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await bulk_upsert(session, request, BULK_SPECS["class_grades"])
+
+@app.post("/class_grades/compute", tags=["Class_grades"], status_code=202)
+async def compute_class_grades(class_id: Optional[List[int]] = Query(None), incremental: bool = False, session: AsyncSession = Depends(get_async_session)):
+    # runs as a compute_class_grades job, poll /jobs/{id}
+    if class_id and incremental:
+        raise HTTPException(status_code=400, detail="use either 'class_id' or 'incremental', not both")
+    return job_status(await job_queue.submit(session, "compute_class_grades", {"class_ids": class_id, "incremental": incremental}))
+
+@app.post("/assignment_grade/bulk", tags=["Assignment_grade"])
+async def bulk_assignment_grade(request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await bulk_upsert(session, request, BULK_SPECS["assignment_grade"])
+
+@app.get("/export/{model}", tags=["Export"])
+async def export_model(model: str, request: Request, format: str = "ndjson", fields: Optional[str] = None, dates: SubmissionDateRange = Depends(), name: Optional[str] = None, age: Optional[int] = None, semester: Optional[str] = None):
+    db_model = get_model(model)
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MEDIA_TYPES)}")
+    filters = []
+    if dates.is_set:
+        if db_model is not AssignmentSubmission:
+            raise HTTPException(status_code=400, detail="'year', 'month', 'from' and 'to' only apply to assignment_submission")
+        filters.extend(dates.filters())
+    if name is not None or age is not None or semester is not None:
+        if db_model is not Student:
+            raise HTTPException(status_code=400, detail="'name', 'age' and 'semester' only apply to student")
+        filters.extend(student_filters(name, age, semester))
+    statement = export_statement(db_model, export_columns(db_model, fields), filters)
+    return StreamingResponse(
+        stream_export(statement, format, lambda: routed_session(request)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{model}.{format}"'},
+    )
+
+@app.get("/assignment_submission/{submission_id}/file", tags=["Assignment_submission"])
+async def get_submission_file(submission_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await submission_file_response(session, submission_id, request.headers.get("range"))
+
+@app.put("/assignment_submission/{submission_id}/file", tags=["Assignment_submission"])
+async def put_submission_file(submission_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    submission = await session.get(AssignmentSubmission, submission_id)
+    if submission is None:
+        raise HTTPException(status_code=404, detail="submission not found")
+    file_hash, file_size, data = await save_upload(request.stream())
+    submission.file_hash = file_hash
+    submission.file_size = file_size
+    submission.submission_file = data
+    await session.commit()
+    await run_in_threadpool(notify_write, AssignmentSubmission, [submission])
+    return {"id": submission_id, "file_hash": file_hash, "file_size": file_size}
+
+@app.post("/jobs", tags=["Jobs"], status_code=202)
+async def submit_job(job: JobCreate, session: AsyncSession = Depends(get_async_session)):
+    return job_status(await job_queue.submit(session, job.type, job.payload))
+
+@app.get("/jobs", tags=["Jobs"])
+async def get_jobs(status: Optional[str] = Query(None, regex=f"^({'|'.join(JOB_STATUSES)})$"), type: Optional[str] = None, params: PageParams = Depends(), session: AsyncSession = Depends(get_async_session)):
+    query = select(Job.id, Job.type, Job.status, Job.attempts, Job.max_attempts, Job.error, Job.created_at, Job.started_at, Job.finished_at, Job.run_after)
+    if status is not None:
+        query = query.where(Job.status == status)
+    if type is not None:
+        query = query.where(Job.type == type)
+    result = await paginate(session, query, params, keys=[SortKey(Job.id, descending=True)])
+    result["data"] = [dict(row._mapping) for row in result["data"]]
+    return result
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job_status(job_id: int, session: AsyncSession = Depends(get_async_session)):
+    return job_status(await get_job(session, job_id))
+
+@app.get("/jobs/{job_id}/result", tags=["Jobs"])
+async def get_job_result(job_id: int, session: AsyncSession = Depends(get_async_session)):
+    job = await get_job(session, job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"job is {job.status}")
+    if isinstance(job.result, dict) and "file" in job.result:
+        path = os.path.join(JOB_FILES_DIR, os.path.basename(job.result["file"]))
+        return FileResponse(path, media_type=job.result.get("media_type"), filename=job.result.get("filename"))
+    return {"id": job.id, "result": job.result}
@@ -0,0 +1,49 @@
+from typing import List, Optional
+
+from sqlalchemy import Select, case, func, select
+
+from model import Assignment, AssignmentGrade, AssignmentSubmission, Enrollment
+from pagination import SortKey
+
+STATUSES = ("pending", "submitted", "graded")
+FEED_KEYS: List[SortKey] = [SortKey(Assignment.due_date), SortKey(Assignment.id)]
+
+
+def assignment_feed(student_id: int, status: Optional[str] = None) -> Select:
+    # every assignment of the student's classes, joined to their latest submission
+    # and its grade; served by the enrollment primary key and the two feed indexes
+    latest = (
+        select(func.max(AssignmentSubmission.id))
+        .where(
+            AssignmentSubmission.student_id == Enrollment.student_id,
+            AssignmentSubmission.assignment_id == Assignment.id,
+        )
+        .correlate(Enrollment, Assignment)
+        .scalar_subquery()
+    )
+    status_column = case(
+        (AssignmentGrade.id.is_not(None), "graded"),
+        (AssignmentSubmission.id.is_not(None), "submitted"),
+        else_="pending",
+    )
+    statement = (
+        select(
+            Assignment.id,
+            Assignment.class_id,
+            Assignment.description,
+            Assignment.due_date,
+            Assignment.created_at,
+            AssignmentSubmission.id.label("submission_id"),
+            AssignmentSubmission.submission_date,
+            AssignmentGrade.grade,
+            status_column.label("status"),
+        )
+        .select_from(Enrollment)
+        .join(Assignment, Assignment.class_id == Enrollment.class_id)
+        .outerjoin(AssignmentSubmission, AssignmentSubmission.id == latest)
+        .outerjoin(AssignmentGrade, AssignmentGrade.submission_id == AssignmentSubmission.id)
+        .where(Enrollment.student_id == student_id)
+    )
+    if status is not None:
+        statement = statement.where(status_column == status)
+    return statement
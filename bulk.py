@@ -0,0 +1,188 @@
+import json
+import os
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from events import notify_write
+
+load_dotenv("config.env")
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+Rows = List[Tuple[int, Dict[str, Any]]]
+
+
+class UpsertSpec(NamedTuple):
+    model: Type[Any]
+    schema: Type[Any]
+    key: Tuple[str, ...]
+    update: Tuple[str, ...] = ()
+    # plain INSERT: conflicting rows are reported instead of skipped or merged
+    upsert: bool = True
+    # runs inside the write transaction and returns (rows to write, rejected rows, skipped rows)
+    prepare: Optional[Callable[[AsyncSession, Rows], Awaitable[Tuple[Rows, List[dict], List[dict]]]]] = None
+
+
+def upsert_statement(dialect: str, spec: UpsertSpec):
+    table = spec.model.__table__
+    if not spec.upsert:
+        return insert(table)
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        if spec.update:
+            return statement.on_conflict_do_update(
+                index_elements=list(spec.key),
+                set_={column: statement.excluded[column] for column in spec.update},
+            )
+        return statement.on_conflict_do_nothing(index_elements=list(spec.key))
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(table)
+        columns = spec.update or spec.key
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in columns})
+    return insert(table)
+
+
+def _parse_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"invalid JSON: {e}"
+
+
+async def read_rows(request: Request) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield (index, *_parse_line(line))
+                    index += 1
+        if buffer.strip():
+            yield (index, *_parse_line(buffer))
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="body must be a JSON array or NDJSON")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="body must be a JSON array or NDJSON")
+    for index, row in enumerate(body):
+        yield index, row, None
+
+
+async def _write_rows(session: AsyncSession, statement, spec: UpsertSpec, rows: Rows) -> Tuple[Rows, List[dict], List[dict]]:
+    rejected: List[dict] = []
+    skipped: List[dict] = []
+    if spec.prepare is not None:
+        rows, rejected, skipped = await spec.prepare(session, rows)
+    if rows:
+        await session.execute(statement, [values for _, values in rows])
+    await session.commit()
+    return rows, rejected, skipped
+
+
+async def _write_chunk(
+    session: AsyncSession,
+    statement,
+    spec: UpsertSpec,
+    rows: Rows,
+    errors: List[dict],
+    duplicates: List[dict],
+) -> int:
+    try:
+        written, rejected, skipped = await _write_rows(session, statement, spec, rows)
+        errors.extend(rejected)
+        duplicates.extend(skipped)
+    except DBAPIError:
+        await session.rollback()
+        # retry row by row so only the offending rows are reported
+        written = []
+        for row in rows:
+            try:
+                row_written, rejected, skipped = await _write_rows(session, statement, spec, [row])
+                written.extend(row_written)
+                errors.extend(rejected)
+                duplicates.extend(skipped)
+            except DBAPIError as e:
+                await session.rollback()
+                errors.append({"index": row[0], "error": str(e.orig)})
+    if written:
+        await run_in_threadpool(notify_write, spec.model, [SimpleNamespace(**values) for _, values in written])
+    return len(written)
+
+
+async def iterate_rows(rows: List[Any]) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    for index, row in enumerate(rows):
+        yield index, row, None
+
+
+async def bulk_upsert(session: AsyncSession, request: Request, spec: UpsertSpec) -> dict:
+    return await upsert_rows(session, read_rows(request), spec)
+
+
+async def upsert_rows(session: AsyncSession, rows: AsyncIterator[Tuple[int, Any, Optional[str]]], spec: UpsertSpec) -> dict:
+    statement = upsert_statement(session.get_bind().dialect.name, spec)
+    received = 0
+    written = 0
+    errors: List[dict] = []
+    # rows dropped because their key repeats inside a chunk, or already exists
+    # (duplicate_of None) when prepare skips it
+    duplicates: List[dict] = []
+    # keyed by the conflict key: a repeated key inside one statement is rejected by PostgreSQL
+    chunk: Dict[Tuple[Any, ...], Tuple[int, Dict[str, Any]]] = {}
+
+    async for index, row, error in rows:
+        received += 1
+        if error is None:
+            try:
+                values = spec.schema.parse_obj(row).dict()
+            except ValidationError as e:
+                error = e.errors()
+        if error is not None:
+            errors.append({"index": index, "error": error})
+            continue
+        key = tuple(values[column] for column in spec.key)
+        if key in chunk:
+            # same outcome as writing the rows one after another: a merge keeps the
+            # last row, DO NOTHING keeps the first and a plain INSERT fails the repeat
+            kept = chunk[key][0]
+            if not spec.upsert:
+                errors.append({"index": index, "error": f"duplicate of row {kept}"})
+                continue
+            if not spec.update:
+                duplicates.append({"index": index, "duplicate_of": kept})
+                continue
+            duplicates.append({"index": kept, "duplicate_of": index})
+        chunk[key] = (index, values)
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            written += await _write_chunk(session, statement, spec, list(chunk.values()), errors, duplicates)
+            chunk = {}
+    if chunk:
+        written += await _write_chunk(session, statement, spec, list(chunk.values()), errors, duplicates)
+
+    errors.sort(key=lambda error: error["index"])
+    duplicates.sort(key=lambda duplicate: duplicate["index"])
+    return {
+        "received": received,
+        "written": written,
+        "skipped": len(duplicates),
+        "failed": len(errors),
+        "duplicates": duplicates,
+        "errors": errors,
+    }
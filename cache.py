@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Pattern, Protocol, Set, Tuple
+
+from dotenv import load_dotenv
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from events import on_write
+
+load_dotenv("config.env")
+
+CachedResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    def set(self, key: str, value: CachedResponse, tags: FrozenSet[str], generation: Tuple[int, ...]) -> None:
+        ...
+
+    def generation(self, tags: FrozenSet[str]) -> Tuple[int, ...]:
+        ...
+
+    def invalidate(self, tag: str) -> None:
+        ...
+
+    def invalidated_within(self, tags: FrozenSet[str], seconds: float) -> bool:
+        ...
+
+
+class LRUBackend:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse, FrozenSet[str]]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}
+        self._invalidated_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def generation(self, tags: FrozenSet[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def set(self, key: str, value: CachedResponse, tags: FrozenSet[str], generation: Tuple[int, ...]) -> None:
+        with self._lock:
+            if generation != tuple(self._generations.get(tag, 0) for tag in sorted(tags)):
+                return
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tag: str) -> None:
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            self._invalidated_at[tag] = time.time()
+            for key in list(self._by_tag.get(tag, ())):
+                self._discard(key)
+
+    def invalidated_within(self, tags: FrozenSet[str], seconds: float) -> bool:
+        since = time.time() - seconds
+        with self._lock:
+            return any(self._invalidated_at.get(tag, 0) > since for tag in tags)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            self._by_tag.get(tag, set()).discard(key)
+
+
+class RedisBackend:
+    # shared between workers; any client with the redis-py API works, including fakeredis
+    def __init__(self, client, ttl: float, prefix: str = "response:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        status, headers, body = json.loads(raw)
+        return status, [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers], body.encode("latin-1")
+
+    def generation(self, tags: FrozenSet[str]) -> Tuple[int, ...]:
+        ordered = sorted(tags)
+        values = self.client.mget([f"{self.prefix}gen:{tag}" for tag in ordered]) if ordered else []
+        return tuple(int(value or 0) for value in values)
+
+    def set(self, key: str, value: CachedResponse, tags: FrozenSet[str], generation: Tuple[int, ...]) -> None:
+        if generation != self.generation(tags):
+            return
+        status, headers, body = value
+        raw = json.dumps([status, [(k.decode("latin-1"), v.decode("latin-1")) for k, v in headers], body.decode("latin-1")])
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, raw, ex=max(int(self.ttl), 1))
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}tag:{tag}", key)
+        pipe.execute()
+
+    def invalidate(self, tag: str) -> None:
+        tag_key = f"{self.prefix}tag:{tag}"
+        keys = self.client.smembers(tag_key)
+        pipe = self.client.pipeline()
+        pipe.incr(f"{self.prefix}gen:{tag}")
+        pipe.set(f"{self.prefix}at:{tag}", time.time())
+        if keys:
+            pipe.delete(*[self.prefix + (k.decode() if isinstance(k, bytes) else k) for k in keys])
+        pipe.delete(tag_key)
+        pipe.execute()
+
+    def invalidated_within(self, tags: FrozenSet[str], seconds: float) -> bool:
+        ordered = sorted(tags)
+        values = self.client.mget([f"{self.prefix}at:{tag}" for tag in ordered]) if ordered else []
+        since = time.time() - seconds
+        return any(float(value) > since for value in values if value is not None)
+
+
+def create_backend() -> CacheBackend:
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    if os.getenv("RESPONSE_CACHE_BACKEND", "lru") == "redis":
+        import redis
+
+        return RedisBackend(redis.Redis.from_url(os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")), ttl)
+    return LRUBackend(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")), ttl=ttl)
+
+
+response_cache = create_backend()
+
+
+@on_write
+def _invalidate_responses(model, rows) -> None:
+    response_cache.invalidate(model.__tablename__)
+
+
+def etag_for(body: bytes) -> bytes:
+    return b'"' + hashlib.sha256(body).hexdigest()[:32].encode() + b'"'
+
+
+def _etag_matches(if_none_match: Optional[bytes], etag: bytes) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(b",")]
+    return b"*" in candidates or etag in candidates or b"W/" + etag in candidates
+
+
+def cache_key(path: str, query_string: bytes) -> str:
+    # parameters sorted by name only: the sort is stable, so a repeated parameter
+    # keeps its values in request order, which list parameters answer in
+    params = [param for param in query_string.decode("latin-1").split("&") if param]
+    params.sort(key=lambda param: param.partition("=")[0])
+    return f"{path}?{'&'.join(params)}"
+
+
+class ResponseCacheMiddleware:
+    # caches GET responses of the routes in `routes` (path pattern -> tables it reads)
+    # and answers If-None-Match with 304 when the strong ETag still matches.
+    # Requests `bypass` returns True for are neither answered from nor stored in the cache;
+    # a response read from a replica is not stored while the replica may still lag
+    # (`replica_lag` seconds) behind the last invalidation of its tags.
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: CacheBackend,
+        routes: Iterable[Tuple[Pattern, Iterable[str]]],
+        bypass: Optional[Callable[[Request], bool]] = None,
+        replica_lag: float = 0,
+    ):
+        self.app = app
+        self.backend = backend
+        self.routes = [(pattern, frozenset(tags)) for pattern, tags in routes]
+        self.bypass = bypass
+        self.replica_lag = replica_lag
+
+    def _tags(self, path: str) -> Optional[FrozenSet[str]]:
+        for pattern, tags in self.routes:
+            match = pattern.match(path)
+            if match:
+                return tags | frozenset(match.groupdict().values()) - {None}
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        tags = self._tags(scope["path"])
+        if tags is None or (self.bypass is not None and self.bypass(Request(scope))):
+            return await self.app(scope, receive, send)
+
+        key = cache_key(scope["path"], scope.get("query_string", b""))
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+
+        cached = self.backend.get(key)
+        if cached is not None:
+            return await self._send(send, cached, if_none_match, b"HIT")
+
+        generation = self.backend.generation(tags)
+        start: Dict = {}
+        body: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            content = b"".join(body)
+            headers = [(k, v) for k, v in start["headers"] if k.lower() not in (b"etag", b"cache-control")]
+            headers += [(b"etag", etag_for(content)), (b"cache-control", b"no-cache")]
+            response = (start["status"], headers, content)
+            # set by the session dependencies when a replica served the request
+            from_replica = scope.get("state", {}).get("read_replica", False)
+            if start["status"] == 200 and not (from_replica and self.backend.invalidated_within(tags, self.replica_lag)):
+                self.backend.set(key, response, tags, generation)
+            await self._send(send, response, if_none_match, b"MISS")
+
+        await self.app(scope, receive, capture)
+
+    async def _send(self, send: Send, response: CachedResponse, if_none_match: Optional[bytes], state: bytes) -> None:
+        status, headers, body = response
+        etag = dict(headers).get(b"etag")
+        headers = headers + [(b"x-cache", state)]
+        if status == 200 and etag and _etag_matches(if_none_match, etag):
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def cached_routes(tables: Iterable[str]) -> List[Tuple[Pattern, Set[str]]]:
+    # class rows carry enrolled_count, so enrollment writes invalidate them too;
+    # the fast class page embeds each class's subject
+    return [
+        (re.compile(r"^/subject_page$"), {"subject"}),
+        (re.compile(r"^/teacher_page$"), {"teacher"}),
+        (re.compile(r"^/class_page$"), {"class", "enrollment", "subject"}),
+        (re.compile(r"^/(?P<model>class)(/\d+)?$"), {"enrollment"}),
+        # grade analytics, invalidated by writes to the grades and to the tables their dimensions come from,
+        # and when a stale grade snapshot is reloaded
+        (re.compile(r"^/analytics/grades/(?P<model>class_grades)$"), {"class", "student", "grade_analytics"}),
+        (re.compile(r"^/analytics/grades/(?P<model>assignment_grade)$"), {"assignment_submission", "assignment", "class", "student", "grade_analytics"}),
+        (re.compile(rf"^/(?P<model>{'|'.join(map(re.escape, tables))})(/[^/]+)?$"), set()),
+    ]
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Select, Table, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Join
+
+from database import READ_REPLICA_STICKY_SECONDS
+from events import on_write
+
+load_dotenv("config.env")
+
+
+class CountCache:
+    def __init__(self, ttl: float, maxsize: int, replica_lag: float = 0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # how long after a write a replica may still answer with the rows before it
+        self.replica_lag = replica_lag
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, FrozenSet[str]]]" = OrderedDict()
+        self._by_table: Dict[str, Set[Hashable]] = {}
+        self._generations: Dict[str, int] = {}
+        self._invalidated_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._discard(key)
+                return None
+            return entry[1]
+
+    def generation(self, tables: FrozenSet[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def set(
+        self, key: Hashable, value: int, tables: FrozenSet[str], generation: Tuple[int, ...], from_replica: bool = False
+    ) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            # a write landed while we were counting, so the value may already be stale
+            if generation != tuple(self._generations.get(table, 0) for table in sorted(tables)):
+                return
+            since = time.time() - self.replica_lag
+            if from_replica and any(self._invalidated_at.get(table, 0) > since for table in tables):
+                return
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            self._invalidated_at[table] = time.time()
+            for key in list(self._by_table.get(table, ())):
+                self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for table in list(self._by_table):
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._by_table.clear()
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            self._by_table.get(table, set()).discard(key)
+
+
+count_cache = CountCache(
+    ttl=float(os.getenv("COUNT_CACHE_TTL", "60")),
+    maxsize=int(os.getenv("COUNT_CACHE_SIZE", "10000")),
+    replica_lag=READ_REPLICA_STICKY_SECONDS,
+)
+ESTIMATE_MIN_ROWS = int(os.getenv("COUNT_ESTIMATE_MIN_ROWS", "100000"))
+
+
+@on_write
+def _invalidate_counts(model, rows) -> None:
+    count_cache.invalidate(model.__tablename__)
+
+
+def query_tables(statement) -> FrozenSet[str]:
+    names: Set[str] = set()
+
+    def visit(from_) -> None:
+        if isinstance(from_, Join):
+            visit(from_.left)
+            visit(from_.right)
+        elif isinstance(from_, Table):
+            names.add(from_.name)
+
+    for from_ in statement.get_final_froms():
+        visit(from_)
+    return frozenset(names)
+
+
+async def estimate_rows(session: AsyncSession, table: str) -> Optional[int]:
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        value = (await session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        )).scalar()
+    elif dialect in ("mysql", "mariadb"):
+        value = (await session.execute(
+            text("SELECT table_rows FROM information_schema.tables WHERE table_schema = database() AND table_name = :table"),
+            {"table": table},
+        )).scalar()
+    elif dialect == "sqlite":
+        # rowids are never reused below max(rowid), so this is an upper bound
+        value = (await session.execute(text(f'SELECT max(rowid) FROM "{table}"'))).scalar()
+    else:
+        value = None
+    if value is None or value < ESTIMATE_MIN_ROWS:
+        return None
+    return int(value)
+
+
+async def count_rows(session: AsyncSession, statement: Select, estimate: bool = False) -> int:
+    tables = query_tables(statement)
+    if estimate and statement.whereclause is None and len(tables) == 1:
+        estimated = await estimate_rows(session, next(iter(tables)))
+        if estimated is not None:
+            return estimated
+
+    compiled = statement.compile()
+    # replica counts are kept apart, so a session on the primary never reads one
+    from_replica = session.info.get("replica", False)
+    # IN lists arrive as lists, which can't be hashed
+    key = (from_replica, compiled.string, tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in compiled.params.items()
+    )))
+    total = count_cache.get(key)
+    if total is None:
+        generation = count_cache.generation(tables)
+        total = await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+        count_cache.set(key, total, tables, generation, from_replica)
+    return total
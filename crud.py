@@ -0,0 +1,29 @@
+from functools import wraps
+from typing import Any, Callable
+
+from fastapi_crudrouter import SQLAlchemyCRUDRouter
+
+from events import notify_write
+
+
+class CRUDRouter(SQLAlchemyCRUDRouter):
+    def _notifying(self, route: Callable[..., Any], whole_table: bool = False) -> Callable[..., Any]:
+        @wraps(route)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            result = route(*args, **kwargs)
+            notify_write(self.db_model, None if whole_table else [result])
+            return result
+
+        return wrapper
+
+    def _create(self, *args: Any, **kwargs: Any) -> Callable[..., Any]:
+        return self._notifying(super()._create(*args, **kwargs))
+
+    def _update(self, *args: Any, **kwargs: Any) -> Callable[..., Any]:
+        return self._notifying(super()._update(*args, **kwargs))
+
+    def _delete_one(self, *args: Any, **kwargs: Any) -> Callable[..., Any]:
+        return self._notifying(super()._delete_one(*args, **kwargs))
+
+    def _delete_all(self, *args: Any, **kwargs: Any) -> Callable[..., Any]:
+        return self._notifying(super()._delete_all(*args, **kwargs), whole_table=True)
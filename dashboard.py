@@ -0,0 +1,111 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Select, case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model import Assignment, AssignmentGrade, AssignmentSubmission, Class, Student, Subject, Teacher
+from pagination import PageParams, SortKey, paginate
+
+# oldest submissions are graded first
+QUEUE_KEYS = [SortKey(AssignmentSubmission.submission_date), SortKey(AssignmentSubmission.id)]
+# the teacher, the classes, the assignment counts, and a queue page with its count
+DASHBOARD_QUERIES = 5
+
+
+def grading_queue(teacher_id: int, class_id: Optional[int] = None) -> Select:
+    statement = (
+        select(
+            AssignmentSubmission.id,
+            AssignmentSubmission.submission_date,
+            AssignmentSubmission.file_size,
+            AssignmentSubmission.student_id,
+            Student.name.label("student_name"),
+            Assignment.id.label("assignment_id"),
+            Assignment.description.label("assignment"),
+            Assignment.class_id,
+        )
+        .select_from(Class)
+        .join(Assignment, Assignment.class_id == Class.id)
+        .join(AssignmentSubmission, AssignmentSubmission.assignment_id == Assignment.id)
+        .join(Student, Student.id == AssignmentSubmission.student_id)
+        .outerjoin(AssignmentGrade, AssignmentGrade.submission_id == AssignmentSubmission.id)
+        .where(Class.teacher_id == teacher_id, AssignmentGrade.id.is_(None))
+    )
+    if class_id is not None:
+        statement = statement.where(Class.id == class_id)
+    return statement
+
+
+def assignment_counts(teacher_id: int) -> Select:
+    # submissions and ungraded submissions per assignment, for all the teacher's classes at once
+    return (
+        select(
+            Assignment.id,
+            Assignment.class_id,
+            Assignment.description,
+            Assignment.due_date,
+            func.count(AssignmentSubmission.id).label("submissions"),
+            func.count(case((AssignmentGrade.id.is_(None), AssignmentSubmission.id))).label("ungraded"),
+        )
+        .select_from(Class)
+        .join(Assignment, Assignment.class_id == Class.id)
+        .outerjoin(AssignmentSubmission, AssignmentSubmission.assignment_id == Assignment.id)
+        .outerjoin(AssignmentGrade, AssignmentGrade.submission_id == AssignmentSubmission.id)
+        .where(Class.teacher_id == teacher_id)
+        .group_by(Assignment.id, Assignment.class_id, Assignment.description, Assignment.due_date)
+        .order_by(Assignment.class_id, Assignment.due_date, Assignment.id)
+    )
+
+
+async def teacher_dashboard(
+    session: AsyncSession, teacher_id: int, params: PageParams, class_id: Optional[int] = None
+) -> dict:
+    teacher = await session.get(Teacher, teacher_id)
+    if teacher is None:
+        raise HTTPException(status_code=404, detail="teacher not found")
+
+    classes = (await session.execute(
+        select(
+            Class.id,
+            Class.schedule,
+            Class.student_limit,
+            Class.enrolled_count,
+            Subject.id.label("subject_id"),
+            Subject.name.label("subject"),
+            Subject.code.label("subject_code"),
+        )
+        .join(Subject, Subject.id == Class.subject_id)
+        .where(Class.teacher_id == teacher_id)
+        .order_by(Class.id)
+    )).all()
+    by_class: Dict[int, dict] = {}
+    for row in classes:
+        by_class[row.id] = dict(
+            row._mapping,
+            seats_left=max(row.student_limit - row.enrolled_count, 0),
+            submissions=0,
+            ungraded=0,
+            assignments=[],
+        )
+    if class_id is not None and class_id not in by_class:
+        raise HTTPException(status_code=404, detail="class not found for this teacher")
+
+    for row in (await session.execute(assignment_counts(teacher_id))).all():
+        class_ = by_class[row.class_id]
+        assignment = dict(row._mapping)
+        del assignment["class_id"]
+        class_["assignments"].append(assignment)
+        class_["submissions"] += row.submissions
+        class_["ungraded"] += row.ungraded
+
+    queue = await paginate(session, grading_queue(teacher_id, class_id), params, keys=QUEUE_KEYS)
+    queue["data"] = [dict(row._mapping) for row in queue["data"]]
+
+    class_rows = list(by_class.values())
+    return {
+        "teacher": {"id": teacher.id, "name": teacher.name, "email": teacher.email},
+        "classes": class_rows,
+        "ungraded": sum(class_["ungraded"] for class_ in class_rows),
+        "grading_queue": queue,
+    }
@@ -0,0 +1,110 @@
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Generator, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from replicas import Replica, ReplicaPool, wants_primary
+
+load_dotenv("config.env")
+
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"no async driver known for '{backend}', set ASYNC_DATABASE_URL")
+    if parsed.get_driver_name() == driver:
+        return url
+    return parsed.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+def pool_options(url: URL) -> dict:
+    options = {"pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800"))}
+    # in-memory SQLite uses a single shared connection and takes no sizing options
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    )
+    return options
+
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, echo=False, **pool_options(make_url(DATABASE_URL)))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **pool_options(make_url(ASYNC_DATABASE_URL)))
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+# comma separated; GET requests read from these unless they ask for the primary
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+# round_robin or least_connections
+READ_REPLICA_STRATEGY = os.getenv("READ_REPLICA_STRATEGY", "round_robin")
+READ_REPLICA_HEALTH_INTERVAL = float(os.getenv("READ_REPLICA_HEALTH_INTERVAL", "10"))
+# how long a client keeps reading from the primary after one of its writes
+READ_REPLICA_STICKY_SECONDS = float(os.getenv("READ_REPLICA_STICKY_SECONDS", "5"))
+
+
+def _replica(url: str) -> Replica:
+    async_url = to_async_url(url)
+    return Replica(
+        url,
+        create_engine(url, echo=False, **pool_options(make_url(url))),
+        create_async_engine(async_url, echo=False, **pool_options(make_url(async_url))),
+    )
+
+
+replica_pool = ReplicaPool(
+    [_replica(url) for url in READ_REPLICA_URLS],
+    strategy=READ_REPLICA_STRATEGY,
+    health_interval=READ_REPLICA_HEALTH_INTERVAL,
+)
+
+
+def _route(request: Request) -> Optional[Replica]:
+    replica = None if wants_primary(request) else replica_pool.choose()
+    if replica is not None:
+        # the response and count caches don't keep what a lagging replica may have answered
+        request.state.read_replica = True
+    return replica
+
+
+def get_session(request: Request) -> Generator[Session, None, None]:
+    replica = _route(request)
+    session = Session(replica.engine if replica is not None else engine, info={"replica": replica is not None})
+    with replica_pool.using(replica):
+        try:
+            yield session
+        finally:
+            session.close()
+
+
+@asynccontextmanager
+async def routed_session(request: Request) -> AsyncIterator[AsyncSession]:
+    # for sessions that outlive the handler, like a streamed response body
+    replica = _route(request)
+    sessionmaker = replica.sessionmaker if replica is not None else AsyncSessionLocal
+    with replica_pool.using(replica):
+        async with sessionmaker(info={"replica": replica is not None}) as session:
+            yield session
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with routed_session(request) as session:
+        yield session
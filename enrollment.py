@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from bulk import Rows
+from events import notify_write
+from model import Class, Enrollment
+
+# Seats are reserved with a conditional UPDATE on class.enrolled_count in the
+# same transaction as the enrollment insert. The database serialises updates
+# of the class row, so concurrent requests can never push the count past
+# student_limit, and a failed insert rolls the reservation back with it.
+
+
+async def _take_seats(session: AsyncSession, class_id: int, seats: int) -> int:
+    while seats > 0:
+        result = await session.execute(
+            update(Class)
+            .where(Class.id == class_id, Class.enrolled_count + seats <= Class.student_limit)
+            .values(enrolled_count=Class.enrolled_count + seats)
+        )
+        if result.rowcount == 1:
+            return seats
+        row = (await session.execute(
+            select(Class.student_limit, Class.enrolled_count).where(Class.id == class_id)
+        )).first()
+        if row is None:
+            return 0
+        seats = min(seats, row.student_limit - row.enrolled_count)
+    return 0
+
+
+async def enroll(session: AsyncSession, student_id: int, class_id: int) -> Enrollment:
+    if await _take_seats(session, class_id, 1) == 0:
+        exists = await session.scalar(select(Class.id).where(Class.id == class_id))
+        await session.rollback()
+        if exists is None:
+            raise HTTPException(status_code=404, detail="class not found")
+        raise HTTPException(status_code=409, detail="class is full")
+    enrollment = Enrollment(student_id=student_id, class_id=class_id)
+    session.add(enrollment)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="student is already enrolled in this class or does not exist")
+    await run_in_threadpool(notify_write, Enrollment, [enrollment])
+    return enrollment
+
+
+async def unenroll(session: AsyncSession, student_id: int, class_id: int) -> None:
+    result = await session.execute(
+        delete(Enrollment).where(Enrollment.student_id == student_id, Enrollment.class_id == class_id)
+    )
+    if result.rowcount == 0:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="enrollment not found")
+    await session.execute(
+        update(Class).where(Class.id == class_id).values(enrolled_count=Class.enrolled_count - 1)
+    )
+    await session.commit()
+    await run_in_threadpool(notify_write, Enrollment, [Enrollment(student_id=student_id, class_id=class_id)])
+
+
+async def _take_bulk_seats(session: AsyncSession, wanted: Dict[int, int]) -> Dict[int, int]:
+    # one conditional UPDATE for all classes; the classes without room for every
+    # row are read back and retried with the seats they have left
+    taken: Dict[int, int] = {}
+    while wanted:
+        seats = case(wanted, value=Class.id)
+        result = await session.execute(
+            update(Class)
+            .where(Class.id.in_(list(wanted)), Class.enrolled_count + seats <= Class.student_limit)
+            .values(enrolled_count=Class.enrolled_count + seats)
+            .returning(Class.id)
+            .execution_options(synchronize_session=False)
+        )
+        for class_id in result.scalars().all():
+            taken[class_id] = wanted.pop(class_id)
+        if not wanted:
+            break
+        left = dict((await session.execute(
+            select(Class.id, Class.student_limit - Class.enrolled_count).where(Class.id.in_(list(wanted)))
+        )).tuples().all())
+        wanted = {
+            class_id: min(count, left[class_id])
+            for class_id, count in wanted.items()
+            if left.get(class_id, 0) > 0
+        }
+    return taken
+
+
+async def reserve_bulk_seats(session: AsyncSession, rows: Rows) -> Tuple[Rows, List[dict], List[dict]]:
+    keys = [(values["student_id"], values["class_id"]) for _, values in rows]
+    existing = set((await session.execute(
+        select(Enrollment.student_id, Enrollment.class_id)
+        .where(tuple_(Enrollment.student_id, Enrollment.class_id).in_(keys))
+    )).tuples())
+
+    by_class: Dict[int, Rows] = defaultdict(list)
+    skipped: List[dict] = []
+    for index, values in rows:
+        # already enrolled rows are a no-op and must not take another seat
+        if (values["student_id"], values["class_id"]) in existing:
+            skipped.append({"index": index, "duplicate_of": None})
+        else:
+            by_class[values["class_id"]].append((index, values))
+
+    wanted = {class_id: len(class_rows) for class_id, class_rows in by_class.items()}
+    if session.get_bind().dialect.update_returning:
+        taken = await _take_bulk_seats(session, wanted)
+    else:
+        taken = {class_id: await _take_seats(session, class_id, count) for class_id, count in wanted.items()}
+
+    accepted: Rows = []
+    rejected: List[dict] = []
+    for class_id, class_rows in by_class.items():
+        seats = taken.get(class_id, 0)
+        accepted.extend(class_rows[:seats])
+        rejected.extend(
+            {"index": index, "error": f"class {class_id} is full or does not exist"}
+            for index, _ in class_rows[seats:]
+        )
+    return accepted, rejected, skipped
@@ -0,0 +1,18 @@
+from typing import Any, Callable, Iterable, List, Optional, Type
+
+WriteListener = Callable[[Type[Any], Optional[Iterable[Any]]], None]
+
+_write_listeners: List[WriteListener] = []
+
+
+def on_write(listener: WriteListener) -> WriteListener:
+    _write_listeners.append(listener)
+    return listener
+
+
+def notify_write(model: Type[Any], rows: Optional[Iterable[Any]] = None) -> None:
+    # rows=None means the whole table may have changed
+    if rows is not None:
+        rows = list(rows)
+    for listener in _write_listeners:
+        listener(model, rows)
@@ -0,0 +1,132 @@
+import base64
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import date, datetime
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import LargeBinary, Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from jobs import JOB_FILES_DIR, JobError, job_handler
+from model import (
+    Student,
+    Teacher,
+    Subject,
+    Class,
+    Assignment,
+    AssignmentSubmission,
+    AssignmentGrade,
+    Enrollment,
+    ClassGrades,
+)
+
+load_dotenv("config.env")
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MODELS: Dict[str, Any] = {
+    model.__tablename__: model
+    for model in (
+        Student,
+        Teacher,
+        Subject,
+        Class,
+        Assignment,
+        AssignmentSubmission,
+        AssignmentGrade,
+        Enrollment,
+        ClassGrades,
+    )
+}
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def get_model(name: str) -> Any:
+    model = MODELS.get(name)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"unknown model '{name}'")
+    return model
+
+
+def export_columns(model: Any, fields: Optional[str] = None) -> List[Any]:
+    table = model.__table__
+    if not fields:
+        # blobs are only exported when asked for by name
+        return [column for column in table.columns if not isinstance(column.type, LargeBinary)]
+    columns = []
+    for name in fields.split(","):
+        name = name.strip()
+        if name not in table.columns:
+            raise HTTPException(status_code=400, detail=f"unknown field '{name}' for {table.name}")
+        columns.append(table.columns[name])
+    return columns
+
+
+def export_statement(model: Any, columns: Sequence[Any], filters: Sequence[Any] = ()) -> Select:
+    primary_key = list(model.__table__.primary_key.columns)
+    return select(*columns).where(*filters).order_by(*primary_key)
+
+
+def _value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    return value
+
+
+def _ndjson(names: List[str], rows: Sequence[Any]) -> str:
+    return "".join(
+        json.dumps({name: _value(value) for name, value in zip(names, row)}) + "\n"
+        for row in rows
+    )
+
+
+def _csv(rows: Sequence[Any]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_export(
+    statement: Select, format: str, sessionmaker: Callable[[], AsyncContextManager[AsyncSession]] = AsyncSessionLocal
+) -> AsyncIterator[str]:
+    names = [column.key for column in statement.selected_columns]
+    if format == "csv":
+        yield _csv([names])
+    # the session lives as long as the response body, not the request handler
+    async with sessionmaker() as session:
+        result = await session.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield _csv(rows) if format == "csv" else _ndjson(names, rows)
+
+
+@job_handler("export", concurrency=2)
+async def export_job(payload: dict) -> dict:
+    # {"model": "student", "format": "csv", "fields": "id,name"}; the file is served by /jobs/{id}/result
+    format = payload.get("format", "ndjson")
+    if format not in MEDIA_TYPES:
+        raise JobError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+    try:
+        model = get_model(payload.get("model"))
+        columns = export_columns(model, payload.get("fields"))
+    except HTTPException as e:
+        raise JobError(e.detail)
+    os.makedirs(JOB_FILES_DIR, exist_ok=True)
+    name = f"{model.__tablename__}-{uuid.uuid4().hex}.{format}"
+    size = 0
+    with open(os.path.join(JOB_FILES_DIR, name), "w") as f:
+        async for chunk in stream_export(export_statement(model, columns), format):
+            size += await run_in_threadpool(f.write, chunk)
+    return {"file": name, "media_type": MEDIA_TYPES[format], "filename": f"{model.__tablename__}.{format}", "size": size}
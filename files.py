@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from database import AsyncSessionLocal
+from model import AssignmentSubmission
+
+load_dotenv("config.env")
+
+FILE_CHUNK_SIZE = int(os.getenv("FILE_CHUNK_SIZE", str(256 * 1024)))
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> Tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await run_in_threadpool(tmp.write, chunk)
+            target = self.path(digest.hexdigest())
+            if target.exists():
+                # same content is already stored, keep the single copy
+                os.unlink(tmp_name)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, target)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return digest.hexdigest(), size
+
+    def read(self, digest: str, start: int, end: int) -> Iterator[bytes]:
+        with open(self.path(digest), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+blob_store = BlobStore(os.environ["BLOB_STORE_PATH"]) if os.getenv("BLOB_STORE_PATH") else None
+
+
+async def save_upload(chunks: AsyncIterator[bytes]) -> Tuple[str, int, Optional[bytes]]:
+    if blob_store is not None:
+        digest, size = await blob_store.save(chunks)
+        return digest, size, None
+    # without a blob store the bytes end up in the submission_file column
+    digest = hashlib.sha256()
+    parts = []
+    async for chunk in chunks:
+        digest.update(chunk)
+        parts.append(chunk)
+    data = b"".join(parts)
+    return digest.hexdigest(), len(data), data
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        # multipart ranges are not supported, the whole body is a valid answer
+        return None
+    first, _, last = spec.partition("-")
+    try:
+        if first == "":
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def _db_chunks(submission_id: int, start: int, end: int) -> AsyncIterator[bytes]:
+    async with AsyncSessionLocal() as session:
+        position = start
+        while position <= end:
+            length = min(FILE_CHUNK_SIZE, end - position + 1)
+            chunk = await session.scalar(
+                select(func.substr(AssignmentSubmission.submission_file, position + 1, length))
+                .where(AssignmentSubmission.id == submission_id)
+            )
+            if not chunk:
+                break
+            position += len(chunk)
+            yield bytes(chunk)
+
+
+async def submission_file_response(session, submission_id: int, range_header: Optional[str]) -> StreamingResponse:
+    row = (await session.execute(
+        select(
+            AssignmentSubmission.file_hash,
+            func.coalesce(AssignmentSubmission.file_size, func.length(AssignmentSubmission.submission_file)).label("size"),
+            AssignmentSubmission.submission_file.is_not(None).label("in_db"),
+        ).where(AssignmentSubmission.id == submission_id)
+    )).first()
+    if row is None or row.size is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    # without the bytes in the row the content lives in the blob store only
+    in_blob_store = not row.in_db and blob_store is not None and row.file_hash and blob_store.exists(row.file_hash)
+    if not row.in_db and not in_blob_store:
+        raise HTTPException(status_code=404, detail="file content not found")
+
+    size = row.size
+    byte_range = parse_range(range_header, size) if size else None
+    start, end = byte_range or (0, size - 1)
+    if in_blob_store:
+        body = blob_store.read(row.file_hash, start, end)
+    else:
+        body = _db_chunks(submission_id, start, end)
+
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if row.file_hash:
+        headers["ETag"] = f'"{row.file_hash}"'
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        body,
+        status_code=206 if byte_range is not None else 200,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
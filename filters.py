@@ -0,0 +1,191 @@
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Request
+from sqlalchemy import Column, Select, Table, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model import AssignmentSubmission, Student
+from pagination import PageParams, SortKey, paginate
+
+FILTER_PARAM = re.compile(r"^filter\[(\w+)\](?:\[(\w+)\])?$")
+MAX_IN_VALUES = 100
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "eq": lambda column, value: column == value,
+    "ne": lambda column, value: column != value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+    "in": lambda column, values: column.in_(values),
+    # a prefix match can still use the index, a substring match cannot
+    "prefix": lambda column, value: column.startswith(value, autoescape=True),
+    "null": lambda column, value: column.is_(None) if value else column.is_not(None),
+}
+
+
+class SubmissionDateRange:
+    # half-open [lower, upper) bounds on the bare column, so the
+    # submission_date index is used instead of scanning extract(year ...)
+    def __init__(
+        self,
+        # the year after it bounds the range, so 9999 can not be given
+        year: Optional[int] = Query(None, ge=1, le=9998),
+        month: Optional[int] = Query(None, ge=1, le=12),
+        start: Optional[date] = Query(None, alias="from"),
+        end: Optional[date] = Query(None, alias="to", description="inclusive"),
+    ):
+        if month is not None and year is None:
+            raise HTTPException(status_code=400, detail="'month' requires 'year'")
+        self.lower: Optional[datetime] = None
+        self.upper: Optional[datetime] = None
+        if year is not None:
+            self.lower = datetime(year, month or 1, 1)
+            if month is None or month == 12:
+                self.upper = datetime(year + 1, 1, 1)
+            else:
+                self.upper = datetime(year, month + 1, 1)
+        if start is not None:
+            start_at = datetime.combine(start, time.min)
+            self.lower = max(self.lower, start_at) if self.lower else start_at
+        if end is not None:
+            try:
+                end_before = datetime.combine(end + timedelta(days=1), time.min)
+            except OverflowError:
+                raise HTTPException(status_code=400, detail="'to' must be before 9999-12-31")
+            self.upper = min(self.upper, end_before) if self.upper else end_before
+
+    @property
+    def is_set(self) -> bool:
+        return self.lower is not None or self.upper is not None
+
+    def filters(self) -> List:
+        filters = []
+        if self.lower is not None:
+            filters.append(AssignmentSubmission.submission_date >= self.lower)
+        if self.upper is not None:
+            filters.append(AssignmentSubmission.submission_date < self.upper)
+        return filters
+
+
+def student_filters(name: Optional[str] = None, age: Optional[int] = None, semester: Optional[str] = None) -> List:
+    filters = []
+    if name is not None:
+        filters.append(Student.name.like(f"%{name}%"))
+    if age is not None:
+        filters.append(Student.age == age)
+    if semester is not None:
+        filters.append(Student.semester == semester)
+    return filters
+
+
+def indexed_columns(table: Table) -> Dict[str, Column]:
+    # the columns an index can be searched by: the leading primary key column and
+    # the leading column of every index; only these can be filtered and sorted on
+    columns = [next(iter(table.primary_key.columns))]
+    columns += [next(iter(index.columns)) for index in table.indexes if index.columns]
+    return {column.name: column for column in columns}
+
+
+def _parse(column: Column, raw: str) -> Any:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        # sqlmodel's AutoString
+        python_type = str
+    try:
+        if python_type is bool:
+            if raw.lower() not in ("true", "false", "1", "0"):
+                raise ValueError(raw)
+            return raw.lower() in ("true", "1")
+        if python_type in (datetime, date):
+            return python_type.fromisoformat(raw)
+        return python_type(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid value '{raw}' for '{column.name}'")
+
+
+class ListQuery:
+    def __init__(self, model: Any, filters: List[Any], keys: List[SortKey], columns: List[Column]):
+        self.model = model
+        self.filters = filters
+        self.keys = keys
+        self.columns = columns
+
+    def select(self, columns: Sequence[Any] = ()) -> Select:
+        # sort columns are always selected, the cursor is built from them
+        columns = list(self.columns or columns)
+        if not columns:
+            return select(self.model).where(*self.filters)
+        names = {column.key for column in columns}
+        columns += [key.column for key in self.keys if key.column.key not in names]
+        return select(*columns).where(*self.filters)
+
+    async def page(self, session: AsyncSession, params: PageParams) -> dict:
+        result = await paginate(session, self.select(), params, keys=self.keys)
+        if self.columns:
+            result["data"] = [dict(row._mapping) for row in result["data"]]
+        return result
+
+
+def list_query(model: Any) -> Callable[..., ListQuery]:
+    # ?filter[age][gte]=18&filter[semester]=2024.1&sort=-name&fields=id,name
+    table = model.__table__
+    indexed = indexed_columns(table)
+    primary_key = list(table.primary_key.columns)
+
+    def dependency(
+        request: Request,
+        sort: Optional[str] = Query(None, description=f"comma separated, '-' for descending; one of {', '.join(indexed)}"),
+        fields: Optional[str] = Query(None, description="comma separated columns to return"),
+    ) -> ListQuery:
+        filters = []
+        for param, raw in request.query_params.multi_items():
+            if not param.startswith("filter"):
+                continue
+            match = FILTER_PARAM.match(param)
+            if match is None:
+                raise HTTPException(status_code=400, detail=f"malformed filter '{param}', use filter[field][op]=value")
+            name, op = match.group(1), match.group(2) or "eq"
+            if name not in indexed:
+                raise HTTPException(status_code=400, detail=f"can't filter {table.name} on '{name}', use one of {', '.join(indexed)}")
+            if op not in OPERATORS:
+                raise HTTPException(status_code=400, detail=f"unknown operator '{op}', use one of {', '.join(OPERATORS)}")
+            column = indexed[name]
+            if op == "in":
+                values = raw.split(",")
+                if len(values) > MAX_IN_VALUES:
+                    raise HTTPException(status_code=400, detail=f"at most {MAX_IN_VALUES} values for 'in'")
+                value = [_parse(column, value) for value in values]
+            elif op == "null":
+                value = raw.lower() in ("true", "1")
+            else:
+                value = _parse(column, raw)
+            filters.append(OPERATORS[op](column, value))
+
+        keys: List[SortKey] = []
+        for name in (sort or "").split(","):
+            name = name.strip()
+            if not name:
+                continue
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name not in indexed:
+                raise HTTPException(status_code=400, detail=f"can't sort {table.name} on '{name}', use one of {', '.join(indexed)}")
+            keys.append(SortKey(indexed[name], descending))
+        # the primary key breaks ties, in the direction of the last key so the index can be walked backwards
+        descending = keys[-1].descending if keys else False
+        sorted_names = {key.column.name for key in keys}
+        keys += [SortKey(column, descending) for column in primary_key if column.name not in sorted_names]
+
+        columns = []
+        if fields:
+            for name in fields.split(","):
+                name = name.strip()
+                if name not in table.columns:
+                    raise HTTPException(status_code=400, detail=f"unknown field '{name}' for {table.name}")
+                columns.append(table.columns[name])
+        return ListQuery(model, filters, keys, columns)
+
+    return dependency
@@ -0,0 +1,229 @@
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Select, delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from bulk import BULK_CHUNK_SIZE, UpsertSpec, upsert_statement
+from database import AsyncSessionLocal, engine
+from events import notify_write, on_write
+from jobs import JobError, job_handler
+from model import (
+    Assignment,
+    AssignmentGrade,
+    AssignmentSubmission,
+    ClassGradeChange,
+    ClassGrades,
+    ClassGradesCreate,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# A class grade is the weighted mean of the student's assignment grades in the
+# class, weighted by Assignment.weight. Only graded assignments count, and when
+# an assignment was submitted more than once the latest submission's grade is used.
+
+CLASS_GRADES_SPEC = UpsertSpec(ClassGrades, ClassGradesCreate, key=("student_id", "class_id"), update=("grade",))
+# student ids per IN list when only changed students are loaded
+GRADE_LOAD_BATCH_SIZE = 500
+
+GradeRow = Tuple[int, int, int, int, float, float]
+ClassGrade = Tuple[int, int, float]
+
+
+def grade_rows() -> Select:
+    # (student_id, class_id, assignment_id, submission_id, weight, grade) per graded submission
+    return (
+        select(
+            AssignmentSubmission.student_id,
+            Assignment.class_id,
+            Assignment.id,
+            AssignmentSubmission.id,
+            Assignment.weight,
+            AssignmentGrade.grade,
+        )
+        .select_from(AssignmentGrade)
+        .join(AssignmentSubmission, AssignmentSubmission.id == AssignmentGrade.submission_id)
+        .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+    )
+
+
+def _compute_numpy(rows: Sequence[GradeRow]) -> List[ClassGrade]:
+    data = np.asarray(rows, dtype=np.float64)
+    ids = data[:, :4].astype(np.int64)
+    student, class_, assignment, submission = ids.T
+    weight, grade = data[:, 4], data[:, 5]
+    # keep the last submission of every (student, assignment)
+    order = np.lexsort((submission, assignment, student))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (student[order][1:] != student[order][:-1]) | (assignment[order][1:] != assignment[order][:-1])
+    kept = order[last]
+    # group by (student, class) through one integer key
+    span = int(class_.max()) + 1
+    keys, groups = np.unique(student[kept] * span + class_[kept], return_inverse=True)
+    groups = groups.reshape(-1)
+    weighted = np.bincount(groups, weights=weight[kept] * grade[kept], minlength=len(keys))
+    weights = np.bincount(groups, weights=weight[kept], minlength=len(keys))
+    graded = weights > 0
+    means = (weighted[graded] / weights[graded]).tolist()
+    keys = keys[graded]
+    return [
+        (student_id, class_id, round(mean, 2))
+        for student_id, class_id, mean in zip((keys // span).tolist(), (keys % span).tolist(), means)
+    ]
+
+
+def _compute_python(rows: Sequence[GradeRow]) -> List[ClassGrade]:
+    latest: Dict[Tuple[int, int], Tuple[int, int, float, float]] = {}
+    for student_id, class_id, assignment_id, submission_id, weight, grade in rows:
+        key = (student_id, assignment_id)
+        if key not in latest or submission_id > latest[key][0]:
+            latest[key] = (submission_id, class_id, weight, grade)
+    totals: Dict[Tuple[int, int], List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for (student_id, _), (_, class_id, weight, grade) in latest.items():
+        total = totals[(student_id, class_id)]
+        total[0] += weight * grade
+        total[1] += weight
+    return [
+        (student_id, class_id, round(weighted / weights, 2))
+        for (student_id, class_id), (weighted, weights) in totals.items()
+        if weights > 0
+    ]
+
+
+def compute_class_grades(rows: Sequence[GradeRow]) -> List[ClassGrade]:
+    if not rows:
+        return []
+    if np is None:
+        return _compute_python(rows)
+    return _compute_numpy(rows)
+
+
+async def _load(session: AsyncSession, statement: Select, rows: List[GradeRow]) -> None:
+    result = await session.stream(statement.execution_options(yield_per=BULK_CHUNK_SIZE))
+    async for partition in result.partitions():
+        rows.extend(tuple(row) for row in partition)
+
+
+async def _write_class_grades(session: AsyncSession, grades: Sequence[ClassGrade]) -> List[dict]:
+    # left uncommitted, the caller commits it with the rest of the run
+    statement = upsert_statement(session.get_bind().dialect.name, CLASS_GRADES_SPEC)
+    rows = [{"student_id": student_id, "class_id": class_id, "grade": grade} for student_id, class_id, grade in grades]
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        await session.execute(statement, rows[start:start + BULK_CHUNK_SIZE])
+    return rows
+
+
+async def recompute_class_grades(
+    session: AsyncSession, class_ids: Optional[Sequence[int]] = None, incremental: bool = False
+) -> dict:
+    rows: List[GradeRow] = []
+    # (student, class) pairs whose grades changed; those left without any grade lose their class grade
+    changed_pairs: Set[Tuple[int, int]] = set()
+    # classes recomputed as a whole, None for all of them; the same goes for their class grades
+    scope: Optional[List[int]] = None
+    last_change = None
+    if incremental:
+        changes = (await session.execute(
+            select(ClassGradeChange.id, ClassGradeChange.student_id, ClassGradeChange.class_id)
+        )).all()
+        if not changes:
+            return {"students": 0, "written": 0, "removed": 0}
+        last_change = max(change.id for change in changes)
+        if any(change.student_id is None and change.class_id is None for change in changes):
+            await _load(session, grade_rows(), rows)
+        else:
+            students = sorted({change.student_id for change in changes if change.student_id is not None})
+            scope = sorted({change.class_id for change in changes if change.student_id is None})
+            changed_pairs = {(change.student_id, change.class_id) for change in changes if change.student_id is not None}
+            for start in range(0, len(students), GRADE_LOAD_BATCH_SIZE):
+                batch = students[start:start + GRADE_LOAD_BATCH_SIZE]
+                await _load(session, grade_rows().where(AssignmentSubmission.student_id.in_(batch)), rows)
+            if scope:
+                await _load(session, grade_rows().where(Assignment.class_id.in_(scope)), rows)
+    elif class_ids:
+        scope = sorted(set(class_ids))
+        await _load(session, grade_rows().where(Assignment.class_id.in_(scope)), rows)
+    else:
+        await _load(session, grade_rows(), rows)
+
+    grades = await run_in_threadpool(compute_class_grades, rows)
+    written = await _write_class_grades(session, grades)
+
+    removed = set(changed_pairs)
+    if scope is None or scope:
+        existing = select(ClassGrades.student_id, ClassGrades.class_id)
+        if scope is not None:
+            existing = existing.where(ClassGrades.class_id.in_(scope))
+        removed.update((await session.execute(existing)).tuples().all())
+    removed -= {(student_id, class_id) for student_id, class_id, _ in grades}
+    removed = sorted(removed)
+    for start in range(0, len(removed), BULK_CHUNK_SIZE):
+        await session.execute(
+            delete(ClassGrades).where(tuple_(ClassGrades.student_id, ClassGrades.class_id).in_(removed[start:start + BULK_CHUNK_SIZE]))
+        )
+    if last_change is not None:
+        # consumed in the same transaction as the writes; changes recorded while
+        # this run was computing are left for the next one
+        await session.execute(delete(ClassGradeChange).where(ClassGradeChange.id <= last_change))
+    await session.commit()
+    if written or removed:
+        await run_in_threadpool(
+            notify_write, ClassGrades,
+            [SimpleNamespace(**row) for row in written]
+            + [SimpleNamespace(student_id=student_id, class_id=class_id) for student_id, class_id in removed],
+        )
+    return {
+        "students": len({student_id for student_id, _, _ in grades}),
+        "written": len(written),
+        "removed": len(removed),
+    }
+
+
+@job_handler("compute_class_grades")
+async def compute_class_grades_job(payload: Any) -> dict:
+    # {"class_ids": [1, 2]} for those classes, {"incremental": true} for what changed, {} for everything
+    payload = payload or {}
+    class_ids = payload.get("class_ids")
+    if class_ids is not None and not (isinstance(class_ids, list) and all(isinstance(i, int) for i in class_ids)):
+        raise JobError("'class_ids' must be a list of class ids")
+    async with AsyncSessionLocal() as session:
+        return await recompute_class_grades(session, class_ids, bool(payload.get("incremental")))
+
+
+@on_write
+def _track_grade_changes(model, rows) -> None:
+    if model not in (Assignment, AssignmentSubmission, AssignmentGrade):
+        return
+    with Session(engine) as session:
+        if rows is None:
+            changes: List[Dict[str, Optional[int]]] = [{"student_id": None, "class_id": None}]
+        elif model is Assignment:
+            # a weight change moves every grade of the class
+            changes = [{"student_id": None, "class_id": row.class_id} for row in rows]
+        elif model is AssignmentSubmission:
+            classes = dict(session.execute(
+                select(Assignment.id, Assignment.class_id).where(Assignment.id.in_({row.assignment_id for row in rows}))
+            ).all())
+            changes = [
+                {"student_id": row.student_id, "class_id": classes[row.assignment_id]}
+                for row in rows if row.assignment_id in classes
+            ]
+        else:
+            changes = [
+                {"student_id": student_id, "class_id": class_id}
+                for student_id, class_id in session.execute(
+                    select(AssignmentSubmission.student_id, Assignment.class_id)
+                    .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+                    .where(AssignmentSubmission.id.in_({row.submission_id for row in rows}))
+                )
+            ]
+        if changes:
+            session.execute(insert(ClassGradeChange), changes)
+            session.commit()
@@ -0,0 +1,267 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+load_dotenv("config.env")
+
+logger = logging.getLogger(__name__)
+
+# raise instead of logging when a route goes over its query budget (set it in tests)
+QUERY_BUDGET_ENFORCE = os.getenv("QUERY_BUDGET_ENFORCE", "").lower() in ("1", "true", "yes")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "rows", "pool_wait", "budget", "scope")
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.pool_wait = 0.0
+        self.budget: Optional[int] = None
+        self.scope = scope
+
+    @property
+    def endpoint(self) -> Optional[str]:
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {route.path if route is not None else self.scope['path']}"
+
+
+# a mutable holder, so threadpool routes and async driver greenlets add to the request's stats
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# called after every statement with (connection, statement, parameters, context, seconds)
+QueryListener = Callable[[Connection, str, Any, Any, float], None]
+
+_query_listeners: List[QueryListener] = []
+
+
+def on_query(listener: QueryListener) -> QueryListener:
+    _query_listeners.append(listener)
+    return listener
+
+
+class _CountingCursor:
+    # wraps the DBAPI cursor of one statement so fetched rows are counted as they are read
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._instrumentation_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is None:
+        return
+    elapsed = time.perf_counter() - context._instrumentation_start
+    for listener in _query_listeners:
+        listener(conn, statement, parameters, context, elapsed)
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    if cursor.description is not None:
+        context.cursor = _CountingCursor(cursor, stats)
+
+
+def _timed_pool_class(pool_class):
+    class TimedPool(pool_class):
+        # pool.recreate() builds self.__class__, so the timing survives engine.dispose()
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                stats = _current.get()
+                if stats is not None:
+                    stats.pool_wait += time.perf_counter() - start
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def instrument(*engines: Engine) -> None:
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        engine.pool.__class__ = _timed_pool_class(type(engine.pool))
+
+
+@contextmanager
+def count_queries() -> Iterator[RequestStats]:
+    # for tests and scripts: collects the statements run inside the block
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryBudget:
+    # route dependency: dependencies=[Depends(QueryBudget(3))]
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+
+    def __call__(self, request: Request) -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = self.max_queries
+
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], List[float]] = {}
+        self.totals: Dict[Tuple[str, str], List[float]] = {}
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats) -> None:
+        key = (method, route)
+        self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+        # per bucket counts followed by the sum and the count
+        histogram = self.latency.setdefault(key, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if elapsed <= bound:
+                histogram[i] += 1
+        histogram[-2] += elapsed
+        histogram[-1] += 1
+        totals = self.totals.setdefault(key, [0, 0.0, 0, 0.0])
+        totals[0] += stats.queries
+        totals[1] += stats.db_time
+        totals[2] += stats.rows
+        totals[3] += stats.pool_wait
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total Requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram[-2]}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram[-1]}")
+        for index, (name, help_text) in enumerate((
+            ("db_queries_total", "SQL statements executed."),
+            ("db_seconds_total", "Time spent executing SQL statements."),
+            ("db_rows_fetched_total", "Rows fetched from the database."),
+            ("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection."),
+        )):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (method, route), totals in sorted(self.totals.items()):
+                lines.append(f'{name}{{method="{method}",route="{route}"}} {totals[index]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _server_timing(stats: RequestStats, elapsed: float) -> bytes:
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows", '
+        f"pool;dur={stats.pool_wait * 1000:.1f}, "
+        f"app;dur={elapsed * 1000:.1f}"
+    ).encode()
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute] = (), metrics: Metrics = metrics):
+        self.app = app
+        self.routes = routes
+        self.metrics = metrics
+
+    def _route(self, scope: Scope) -> str:
+        # the route template keeps label cardinality bounded; responses served
+        # before routing (cache hits) are matched here
+        route = scope.get("route")
+        if route is None:
+            route = next((route for route in self.routes if route.matches(scope)[0] == Match.FULL), None)
+        return route.path if route is not None else "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stats.budget is not None and stats.queries > stats.budget:
+                    detail = f"{scope['method']} {self._route(scope)} ran {stats.queries} queries, budget is {stats.budget}"
+                    if QUERY_BUDGET_ENFORCE:
+                        raise QueryBudgetExceeded(detail)
+                    logger.warning("query budget exceeded: %s", detail)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(stats, time.perf_counter() - start)))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.metrics.observe(scope["method"], self._route(scope), status, time.perf_counter() - start, stats)
+
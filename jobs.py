@@ -0,0 +1,299 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Union
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import AsyncSessionLocal
+from model import Job
+
+load_dotenv("config.env")
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# a running job is claimed again when its worker stops renewing the lease
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# retries wait base * 2 ** (attempt - 1), with jitter, capped at max
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "5"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "600"))
+# where jobs write files their results point to
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", "job_files")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+# takes the job payload and returns a JSON result; plain functions run in the threadpool
+JobHandler = Callable[[Any], Union[Any, Awaitable[Any]]]
+
+
+class JobError(Exception):
+    # raised by handlers for failures a retry would not fix
+    pass
+
+
+class JobType(NamedTuple):
+    handler: JobHandler
+    # jobs of this type running at once in this process
+    concurrency: int
+    max_attempts: int
+
+
+_job_types: Dict[str, JobType] = {}
+
+
+def job_handler(name: str, concurrency: int = 1, max_attempts: int = JOB_MAX_ATTEMPTS) -> Callable[[JobHandler], JobHandler]:
+    def register(handler: JobHandler) -> JobHandler:
+        _job_types[name] = JobType(handler, concurrency, max_attempts)
+        return handler
+
+    return register
+
+
+def job_types() -> List[str]:
+    return sorted(_job_types)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def retry_delay(attempt: int) -> float:
+    delay = min(JOB_RETRY_BASE * 2 ** (attempt - 1), JOB_RETRY_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _failure(e: Exception, attempts: int, max_attempts: int) -> Dict[str, Any]:
+    values: Dict[str, Any] = {"error": f"{e.__class__.__name__}: {e}", "lease_until": None}
+    if attempts < max_attempts and not isinstance(e, JobError):
+        values.update(status=QUEUED, run_after=_now() + timedelta(seconds=retry_delay(attempts)))
+    else:
+        values.update(status=FAILED, finished_at=_now())
+    return values
+
+
+def new_job(name: str, payload: Any = None) -> Job:
+    job_type = _job_types.get(name)
+    if job_type is None:
+        raise HTTPException(status_code=400, detail=f"unknown job type '{name}', use one of {', '.join(job_types())}")
+    now = _now()
+    return Job(type=name, payload=payload, max_attempts=job_type.max_attempts, run_after=now, created_at=now)
+
+
+def enqueue(session: Session, name: str, payload: Any = None) -> Job:
+    # for sync code; the job is picked up on the next poll, after the caller commits
+    job = new_job(name, payload)
+    session.add(job)
+    return job
+
+
+def job_status(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "run_after": job.run_after,
+    }
+
+
+class JobQueue:
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker = AsyncSessionLocal,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self.sessionmaker = sessionmaker
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self._running: Dict[int, asyncio.Task] = {}
+        self._running_types: Dict[str, int] = {}
+        self._wake = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def submit(self, session: AsyncSession, name: str, payload: Any = None) -> Job:
+        job = new_job(name, payload)
+        session.add(job)
+        await session.commit()
+        self._wake.set()
+        return job
+
+    def start(self) -> None:
+        if self.workers > 0 and self._dispatcher is None:
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        self._dispatcher = None
+        interrupted = list(self._running)
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # hand interrupted jobs back without spending an attempt
+        if interrupted:
+            async with self.sessionmaker() as session:
+                await session.execute(
+                    update(Job)
+                    .where(Job.id.in_(interrupted), Job.status == RUNNING)
+                    .values(status=QUEUED, run_after=_now(), lease_until=None, attempts=Job.attempts - 1)
+                )
+                await session.commit()
+
+    async def _dispatch(self) -> None:
+        while True:
+            try:
+                await self._renew_leases()
+                await self._fail_abandoned()
+                await self._claim_and_start()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("job dispatcher failed, retrying")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _free_types(self) -> List[str]:
+        return [
+            name for name, job_type in _job_types.items()
+            if self._running_types.get(name, 0) < job_type.concurrency
+        ]
+
+    async def _renew_leases(self) -> None:
+        if not self._running:
+            return
+        async with self.sessionmaker() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id.in_(list(self._running)), Job.status == RUNNING)
+                .values(lease_until=_now() + self.lease)
+            )
+            await session.commit()
+
+    async def _fail_abandoned(self) -> None:
+        # the worker died on the last attempt; reclaiming it again would never end
+        now = _now()
+        async with self.sessionmaker() as session:
+            await session.execute(
+                update(Job)
+                .where(
+                    Job.status == RUNNING,
+                    Job.lease_until < now,
+                    Job.attempts >= Job.max_attempts,
+                    Job.id.not_in(list(self._running)),
+                )
+                .values(status=FAILED, finished_at=now, lease_until=None, error="lease expired on the last attempt")
+            )
+            await session.commit()
+
+    async def _claim_and_start(self) -> None:
+        free = self.workers - len(self._running)
+        types = self._free_types()
+        if free <= 0 or not types:
+            return
+        now = _now()
+        due = or_(
+            and_(Job.status == QUEUED, Job.run_after <= now),
+            and_(Job.status == RUNNING, Job.lease_until < now, Job.attempts < Job.max_attempts),
+        )
+        async with self.sessionmaker() as session:
+            candidates = (await session.execute(
+                select(Job.id, Job.type, Job.status)
+                .where(due, Job.type.in_(types))
+                .order_by(Job.run_after, Job.id)
+                .limit(free * 4)
+            )).all()
+            for job_id, name, status in candidates:
+                if free <= 0:
+                    break
+                if name not in self._free_types() or job_id in self._running:
+                    continue
+                # the conditional update is the claim; another process may win the race
+                claimed = await session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == status, due)
+                    .values(
+                        status=RUNNING,
+                        attempts=Job.attempts + 1,
+                        started_at=now,
+                        lease_until=now + self.lease,
+                    )
+                )
+                await session.commit()
+                if claimed.rowcount != 1:
+                    continue
+                free -= 1
+                self._running_types[name] = self._running_types.get(name, 0) + 1
+                self._running[job_id] = asyncio.get_running_loop().create_task(self._run(job_id, name))
+
+    async def _run(self, job_id: int, name: str) -> None:
+        try:
+            async with self.sessionmaker() as session:
+                job = await session.get(Job, job_id)
+                payload, attempts, max_attempts = job.payload, job.attempts, job.max_attempts
+            handler = _job_types[name].handler
+            try:
+                if inspect.iscoroutinefunction(handler):
+                    result = await handler(payload)
+                else:
+                    result = await run_in_threadpool(handler, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("job %s (%s) failed on attempt %s: %r", job_id, name, attempts, e)
+                values = _failure(e, attempts, max_attempts)
+            else:
+                values = {"status": SUCCEEDED, "result": result, "error": None, "finished_at": _now(), "lease_until": None}
+            try:
+                await self._finish(job_id, values)
+            except Exception as e:
+                # e.g. a result that is not JSON serialisable; the job must not stay running
+                logger.exception("job %s (%s) could not be finished", job_id, name)
+                await self._finish(job_id, _failure(e, attempts, max_attempts))
+        finally:
+            self._running.pop(job_id, None)
+            self._running_types[name] -= 1
+            self._wake.set()
+
+    async def _finish(self, job_id: int, values: Dict[str, Any]) -> None:
+        async with self.sessionmaker() as session:
+            await session.execute(update(Job).where(Job.id == job_id, Job.status == RUNNING).values(**values))
+            await session.commit()
+
+
+job_queue = JobQueue()
+
+
+async def get_job(session: AsyncSession, job_id: int) -> Job:
+    job = await session.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
@@ -0,0 +1,37 @@
+"""add bulk upsert keys
+
+Revision ID: a1c3e5f70b21
+Revises: 
+Create Date: 2026-10-18 10:12:40.512331
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f70b21'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keep the newest row per key so the unique indexes can be built
+    op.execute(
+        "DELETE FROM class_grades WHERE id NOT IN "
+        "(SELECT max(id) FROM class_grades GROUP BY student_id, class_id)"
+    )
+    op.execute(
+        "DELETE FROM assignment_grade WHERE id NOT IN "
+        "(SELECT max(id) FROM assignment_grade GROUP BY submission_id)"
+    )
+    op.create_index("ix_class_grades_student_id_class_id", "class_grades", ["student_id", "class_id"], unique=True)
+    op.create_index("ix_assignment_grade_submission_id", "assignment_grade", ["submission_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_assignment_grade_submission_id", table_name="assignment_grade")
+    op.drop_index("ix_class_grades_student_id_class_id", table_name="class_grades")
@@ -0,0 +1,42 @@
+"""add assignment feed indexes
+
+Revision ID: a7c4e9d2b15f
+Revises: f3b8d1c6a9e2
+Create Date: 2026-10-18 15:02:47.120385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e9d2b15f'
+down_revision: Union[str, None] = 'f3b8d1c6a9e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# each replaces the single column index that is its prefix
+INDEXES = [
+    ("ix_assignment_class_id_due_date", "assignment", ["class_id", "due_date", "id"], "ix_assignment_class_id", ["class_id"]),
+    (
+        "ix_assignment_submission_student_id_assignment_id",
+        "assignment_submission",
+        ["student_id", "assignment_id", "id"],
+        "ix_assignment_submission_student_id",
+        ["student_id"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns, replaced, _ in INDEXES:
+        op.create_index(name, table, columns)
+        op.drop_index(replaced, table_name=table)
+
+
+def downgrade() -> None:
+    for name, table, _, replaced, replaced_columns in reversed(INDEXES):
+        op.create_index(replaced, table, replaced_columns)
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,34 @@
+"""add submission file metadata
+
+Revision ID: b7d2f4e81c30
+Revises: a1c3e5f70b21
+Create Date: 2026-10-18 11:02:17.204918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4e81c30'
+down_revision: Union[str, None] = 'a1c3e5f70b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("assignment_submission", sa.Column("file_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column("assignment_submission", sa.Column("file_size", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE assignment_submission SET file_size = length(submission_file) "
+        "WHERE submission_file IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("assignment_submission") as batch_op:
+        batch_op.drop_column("file_size")
+        batch_op.drop_column("file_hash")
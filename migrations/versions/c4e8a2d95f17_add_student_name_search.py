@@ -0,0 +1,63 @@
+"""add student name search
+
+Revision ID: c4e8a2d95f17
+Revises: b7d2f4e81c30
+Create Date: 2026-10-18 11:48:53.771042
+
+"""
+import sqlite3
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d95f17'
+down_revision: Union[str, None] = 'b7d2f4e81c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STUDENT_FTS_DDL = [
+    "CREATE VIRTUAL TABLE student_fts USING fts5(name, content='student', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER student_fts_ai AFTER INSERT ON student BEGIN "
+    "INSERT INTO student_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER student_fts_ad AFTER DELETE ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER student_fts_au AFTER UPDATE OF name ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO student_fts(rowid, name) VALUES (new.id, new.name); END",
+]
+
+
+def _sqlite_has_trigram(bind) -> bool:
+    return bind.dialect.name == "sqlite" and sqlite3.sqlite_version_info >= (3, 34)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.create_index("ix_student_name", "student", ["name"])
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            "ix_student_name_trgm",
+            "student",
+            ["name"],
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        )
+    elif _sqlite_has_trigram(bind):
+        for statement in STUDENT_FTS_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO student_fts(student_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.drop_index("ix_student_name_trgm", table_name="student")
+    elif _sqlite_has_trigram(bind):
+        for trigger in ("student_fts_ai", "student_fts_ad", "student_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS student_fts")
+    op.drop_index("ix_student_name", table_name="student")
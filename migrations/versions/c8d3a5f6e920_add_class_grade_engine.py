@@ -0,0 +1,34 @@
+"""add assignment weights and class grade changes
+
+Revision ID: c8d3a5f6e920
+Revises: b2e6f1a8c374
+Create Date: 2026-10-18 16:27:53.804112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d3a5f6e920'
+down_revision: Union[str, None] = 'b2e6f1a8c374'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("assignment", sa.Column("weight", sa.Float(), nullable=False, server_default="1"))
+    op.create_table(
+        "class_grade_change",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("student_id", sa.Integer(), nullable=True),
+        sa.Column("class_id", sa.Integer(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("class_grade_change")
+    with op.batch_alter_table("assignment") as batch_op:
+        batch_op.drop_column("weight")
@@ -0,0 +1,41 @@
+"""index foreign keys and filter columns
+
+Revision ID: d91b6f3a0e58
+Revises: c4e8a2d95f17
+Create Date: 2026-10-18 12:20:05.913377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91b6f3a0e58'
+down_revision: Union[str, None] = 'c4e8a2d95f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_student_age", "student", ["age"]),
+    ("ix_student_semester", "student", ["semester"]),
+    ("ix_class_subject_id", "class", ["subject_id"]),
+    ("ix_class_teacher_id", "class", ["teacher_id"]),
+    ("ix_assignment_class_id", "assignment", ["class_id"]),
+    ("ix_assignment_submission_student_id", "assignment_submission", ["student_id"]),
+    ("ix_assignment_submission_assignment_id", "assignment_submission", ["assignment_id"]),
+    ("ix_assignment_submission_submission_date", "assignment_submission", ["submission_date"]),
+    ("ix_class_grades_class_id", "class_grades", ["class_id"]),
+    ("ix_enrollment_class_id_student_id", "enrollment", ["class_id", "student_id"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
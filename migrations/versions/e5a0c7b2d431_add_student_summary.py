@@ -0,0 +1,49 @@
+"""add student summary
+
+Revision ID: e5a0c7b2d431
+Revises: d91b6f3a0e58
+Create Date: 2026-10-18 13:05:41.662190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a0c7b2d431'
+down_revision: Union[str, None] = 'd91b6f3a0e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "student_summary",
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("student.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("total_workload", sa.Integer(), nullable=False),
+        sa.Column("class_count", sa.Integer(), nullable=False),
+        sa.Column("class_grade_avg", sa.Float(), nullable=True),
+        sa.Column("assignment_grade_avg", sa.Float(), nullable=True),
+    )
+    op.execute(
+        """
+        INSERT INTO student_summary (student_id, total_workload, class_count, class_grade_avg, assignment_grade_avg)
+        SELECT s.id,
+            (SELECT coalesce(sum(sub.workload), 0) FROM enrollment e
+                JOIN class c ON c.id = e.class_id
+                JOIN subject sub ON sub.id = c.subject_id
+                WHERE e.student_id = s.id),
+            (SELECT count(*) FROM enrollment e WHERE e.student_id = s.id),
+            (SELECT avg(cg.grade) FROM class_grades cg WHERE cg.student_id = s.id),
+            (SELECT avg(g.grade) FROM assignment_grade g
+                JOIN assignment_submission a ON a.id = g.submission_id
+                WHERE a.student_id = s.id)
+        FROM student s
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("student_summary")
@@ -0,0 +1,31 @@
+"""add class enrolled count
+
+Revision ID: f3b8d1c6a9e2
+Revises: e5a0c7b2d431
+Create Date: 2026-10-18 13:51:29.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d1c6a9e2'
+down_revision: Union[str, None] = 'e5a0c7b2d431'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("class", sa.Column("enrolled_count", sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        'UPDATE "class" SET enrolled_count = '
+        '(SELECT count(*) FROM enrollment WHERE enrollment.class_id = "class".id)'
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("class") as batch_op:
+        batch_op.drop_column("enrolled_count")
@@ -2,13 +2,14 @@ from functools import partial
 import re
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from sqlalchemy import Column, DateTime, LargeBinary
-from sqlalchemy.orm import Relationship, declared_attr, Mapped
+from sqlalchemy import DDL, JSON, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, Text, event
+from sqlalchemy.orm import Relationship, declared_attr, deferred, Mapped
 from sqlmodel import Relationship, SQLModel as _SQLModel, Field
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
-_snake_1 = partial(re.compile(r"(.)((?<![^A-Za-z])[A-Z][a-z]+)").sub, r"\1_\2")
+# zero-width, so every word boundary of a longer name is found, not every other one
+_snake_1 = partial(re.compile(r"(?<=[A-Za-z])(?=[A-Z][a-z])").sub, "_")
 
 
 def snake_case(string: str) -> str:
@@ -21,15 +22,27 @@ class SQLModel(_SQLModel):
         return snake_case(cls.__name__)
 
 class Enrollment(SQLModel, table=True):
+    # the primary key serves lookups by student, this one serves class rosters
+    __table_args__ = (Index("ix_enrollment_class_id_student_id", "class_id", "student_id"),)
+
     student_id: int = Field(default=None, foreign_key="student.id", primary_key=True)
     class_id: int = Field(default=None, foreign_key="class.id", primary_key=True)
 
 
 class Student(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_student_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    age: int
-    semester: str
+    name: str = Field(index=True)
+    age: int = Field(index=True)
+    semester: str = Field(index=True)
     entry_date: str
     assignment_submissions: List["AssignmentSubmission"] = Relationship(
         back_populates="student"
@@ -62,9 +75,11 @@ class Subject(SQLModel, table=True):
 
 class Class(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    subject_id: int = Field(default=None, foreign_key="subject.id")
-    teacher_id: int = Field(default=None, foreign_key="teacher.id")
+    subject_id: int = Field(default=None, foreign_key="subject.id", index=True)
+    teacher_id: int = Field(default=None, foreign_key="teacher.id", index=True)
     student_limit: int
+    # seats taken, kept in step with enrollment by enrollment.py
+    enrolled_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     schedule: str
     subject: Optional[Subject] = Relationship(back_populates="classes")
     assignments: List["Assignment"] = Relationship(back_populates="class_")
@@ -76,11 +91,16 @@ class Class(SQLModel, table=True):
 
 
 class Assignment(SQLModel, table=True):
+    # a student's assignment feed walks this per class in due date order
+    __table_args__ = (Index("ix_assignment_class_id_due_date", "class_id", "due_date", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     class_id: int = Field(default=None, foreign_key="class.id")
     description: str
     due_date: str
     created_at: str
+    # share of the class grade, relative to the other assignments of the class
+    weight: float = Field(default=1.0, sa_column_kwargs={"server_default": "1"})
     class_: Optional[Class] = Relationship(back_populates="assignments")
     submissions: List["AssignmentSubmission"] = Relationship(
         back_populates="assignment"
@@ -90,18 +110,27 @@ class Assignment(SQLModel, table=True):
 class AssignmentSubmission(
     SQLModel, table=True, custom_table_name="assignment_submission"
 ):
+    # finds a student's latest submission of an assignment without touching the table
+    __table_args__ = (
+        Index("ix_assignment_submission_student_id_assignment_id", "student_id", "assignment_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     student_id: int = Field(default=None, foreign_key="student.id")
-    assignment_id: int = Field(default=None, foreign_key="assignment.id")
-    submission_date: datetime 
+    assignment_id: int = Field(default=None, foreign_key="assignment.id", index=True)
+    submission_date: datetime = Field(index=True)
     comments: Optional[str]
     submission_file: Optional[bytes] = Field(sa_column=Column(LargeBinary))
+    file_hash: Optional[str] = None
+    file_size: Optional[int] = None
     grade: Optional["AssignmentGrade"] = Relationship(back_populates="submission")
     student: Optional[Student] = Relationship(back_populates="assignment_submissions")
     assignment: Optional[Assignment] = Relationship(back_populates="submissions")
 
 
 class AssignmentGrade(SQLModel, table=True, custom_table_name="assignment_grade"):
+    __table_args__ = (Index("ix_assignment_grade_submission_id", "submission_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     submission_id: int = Field(default=None, foreign_key="assignment_submission.id")
     grade: float
@@ -109,14 +138,104 @@ class AssignmentGrade(SQLModel, table=True, custom_table_name="assignment_grade"
 
 
 class ClassGrades(SQLModel, table=True):
+    __table_args__ = (Index("ix_class_grades_student_id_class_id", "student_id", "class_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     student_id: int = Field(default=None, foreign_key="student.id")
-    class_id: int = Field(default=None, foreign_key="class.id")
+    class_id: int = Field(default=None, foreign_key="class.id", index=True)
     grade: float
     student: Optional[Student] = Relationship(back_populates="class_grades")
     class_: Optional[Class] = Relationship(back_populates="class_grades")
 
 
+class StudentSummary(SQLModel, table=True):
+    # maintained by summary.py on enrollment and grade writes
+    student_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("student.id", ondelete="CASCADE"), primary_key=True)
+    )
+    total_workload: int = 0
+    class_count: int = 0
+    class_grade_avg: Optional[float] = None
+    assignment_grade_avg: Optional[float] = None
+
+
+class ClassGradeChange(SQLModel, table=True):
+    # written by grades.py when assignment grades change, consumed by the incremental
+    # class grade run; a null student_id marks the whole class, both null everything
+    id: Optional[int] = Field(default=None, primary_key=True)
+    student_id: Optional[int] = None
+    class_id: Optional[int] = None
+
+
+class Job(SQLModel, table=True):
+    # background work run by jobs.py; a running job whose lease ran out was
+    # left behind by a stopped worker and is claimed again
+    __table_args__ = (Index("ix_job_status_run_after", "status", "run_after"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    type: str
+    status: str = "queued"
+    payload: Optional[Any] = Field(default=None, sa_column=Column(JSON))
+    result: Optional[Any] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None, sa_column=Column(Text))
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime
+    lease_until: Optional[datetime] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# keep the blob out of every default load; it is served by /assignment_submission/{id}/file
+AssignmentSubmission.__mapper__.add_property(
+    "submission_file", deferred(AssignmentSubmission.__table__.c.submission_file)
+)
+
+
+# name search: pg_trgm on PostgreSQL, an FTS5 trigram index kept in sync by triggers on SQLite
+STUDENT_FTS_DDL = [
+    "CREATE VIRTUAL TABLE student_fts USING fts5(name, content='student', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER student_fts_ai AFTER INSERT ON student BEGIN "
+    "INSERT INTO student_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER student_fts_ad AFTER DELETE ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER student_fts_au AFTER UPDATE OF name ON student BEGIN "
+    "INSERT INTO student_fts(student_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO student_fts(rowid, name) VALUES (new.id, new.name); END",
+]
+
+
+def sqlite_has_trigram(ddl, target, bind, **kw) -> bool:
+    return bind.dialect.name == "sqlite" and bind.dialect.dbapi.sqlite_version_info >= (3, 34)
+
+
+event.listen(
+    SQLModel.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+for _statement in STUDENT_FTS_DDL:
+    event.listen(Student.__table__, "after_create", DDL(_statement).execute_if(callable_=sqlite_has_trigram))
+
+
+class AssignmentSubmissionPublic(SQLModel):
+    id: Optional[int]
+    student_id: int
+    assignment_id: int
+    submission_date: datetime
+    comments: Optional[str]
+    file_hash: Optional[str] = None
+    file_size: Optional[int] = None
+
+
+class AssignmentSubmissionCreate(SQLModel):
+    student_id: int
+    assignment_id: int
+    submission_date: datetime
+    comments: Optional[str]
+
+
 class SubjectPublic(SQLModel):
     id: Optional[int]
     name: str
@@ -140,3 +259,39 @@ class StudentPublic(SQLModel):
     age: int
     semester: str
     classes: list["ClassPublic"] = []
+
+
+class ClassCreate(SQLModel):
+    subject_id: int
+    teacher_id: int
+    student_limit: int
+    schedule: str
+
+
+class EnrollmentCreate(SQLModel):
+    student_id: int
+    class_id: int
+
+
+class ClassGradesCreate(SQLModel):
+    student_id: int
+    class_id: int
+    grade: float
+
+
+class AssignmentCreate(SQLModel):
+    class_id: int
+    description: str
+    due_date: str
+    created_at: str
+    weight: float = 1.0
+
+
+class AssignmentGradeCreate(SQLModel):
+    submission_id: int
+    grade: float
+
+
+class JobCreate(SQLModel):
+    type: str
+    payload: Optional[Any] = None
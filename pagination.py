@@ -0,0 +1,168 @@
+import base64
+import binascii
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Query
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from counts import count_rows
+
+load_dotenv("config.env")
+
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", "1000"))
+# what a cursor may hold; anything else never came from encode_cursor
+CURSOR_TYPES = (str, int, float, bool, type(None))
+
+
+class SortKey(NamedTuple):
+    column: Any
+    descending: bool = False
+    # computes the cursor value from a row when the column is an expression
+    value: Optional[Callable[[Any], Any]] = None
+
+
+class PageParams:
+    def __init__(
+        self,
+        page: int = Query(0, ge=0),
+        limit: int = Query(10, ge=1, le=MAX_PAGE_LIMIT),
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        with_total: bool = True,
+        estimate: bool = False,
+    ):
+        if after is not None and before is not None:
+            raise HTTPException(status_code=400, detail="use either 'after' or 'before', not both")
+        self.page = page
+        self.limit = limit
+        self.after = after
+        self.before = before
+        self.with_total = with_total
+        self.estimate = estimate
+
+    @property
+    def cursor(self) -> Optional[str]:
+        return self.after if self.after is not None else self.before
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"can't put {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, CURSOR_TYPES) for value in values):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return values
+
+
+def _cursor_value(key: SortKey, value: Any) -> Any:
+    # dates travel as ISO strings and are compared as dates again
+    try:
+        python_type = key.column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+    if python_type in (datetime, date) and isinstance(value, str):
+        try:
+            return python_type.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+    return value
+
+
+def _normalize(keys: Sequence[Any]) -> List[SortKey]:
+    return [key if isinstance(key, SortKey) else SortKey(key) for key in keys]
+
+
+def _row_values(row: Any, keys: Sequence[SortKey]) -> List[Any]:
+    return [key.value(row) if key.value else getattr(row, key.column.key) for key in keys]
+
+
+def _selects_entity(statement: Select) -> bool:
+    # select(Model) pages ORM instances, column selects page plain rows
+    descriptions = statement.column_descriptions
+    return len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0].get("entity")
+
+
+def keyset_filter(keys: Sequence[SortKey], values: Sequence[Any], backwards: bool = False):
+    # (a, b, c) > (x, y, z) expanded so every key may carry its own direction
+    clauses = []
+    for i, key in enumerate(keys):
+        greater = key.descending == backwards
+        bound = key.column > values[i] if greater else key.column < values[i]
+        clauses.append(and_(*[keys[j].column == values[j] for j in range(i)], bound))
+    return or_(*clauses)
+
+
+def keyset_order(keys: Sequence[SortKey], backwards: bool = False):
+    return [
+        key.column.desc() if key.descending != backwards else key.column.asc()
+        for key in keys
+    ]
+
+
+async def paginate(
+    session: AsyncSession,
+    statement: Select,
+    params: PageParams,
+    keys: Sequence[Any],
+    total: Optional[int] = None,
+) -> dict:
+    keys = _normalize(keys)
+    limit = params.limit
+    backwards = params.before is not None
+
+    if params.cursor is not None:
+        values = [_cursor_value(key, value) for key, value in zip(keys, decode_cursor(params.cursor, len(keys)))]
+        page_statement = statement.where(keyset_filter(keys, values, backwards))
+    else:
+        page_statement = statement
+    page_statement = page_statement.order_by(*keyset_order(keys, backwards)).limit(limit + 1)
+    if params.cursor is None:
+        page_statement = page_statement.offset(params.page * limit)
+
+    result = await session.execute(page_statement)
+    rows = list(result.scalars().all() if _selects_entity(statement) else result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    if total is None and params.with_total:
+        total = await count_rows(session, statement, estimate=params.estimate)
+
+    if backwards:
+        next_cursor = encode_cursor(_row_values(rows[-1], keys)) if rows else None
+        prev_cursor = encode_cursor(_row_values(rows[0], keys)) if rows and has_more else None
+    else:
+        next_cursor = encode_cursor(_row_values(rows[-1], keys)) if rows and has_more else None
+        has_prev = params.after is not None or params.page > 0
+        prev_cursor = encode_cursor(_row_values(rows[0], keys)) if rows and has_prev else None
+
+    return {
+        "data": rows,
+        "pagination": {
+            "total_pages": (total // limit) + 1 if total is not None else None,
+            "current_page": (params.page // limit) + 1,
+            "total": total,
+            "offset": params.page,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        },
+    }
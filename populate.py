@@ -1,9 +1,29 @@
-from datetime import datetime
+# Synthetic data generator.
+#
+#   python populate.py                                  # 10k rows into DATABASE_URL
+#   python populate.py --rows 10m --workers 8 --seed 7
+#   python populate.py --rows 1m --blob-size 65536 --blob-fraction 0.2 --reset
+#
+# Tables are cut into partitions and every partition draws from its own random
+# stream seeded by (--seed, table, partition), so the data only depends on
+# --seed and --rows, never on --workers. Ids are assigned explicitly from
+# per-partition offsets, which lets workers generate and insert partitions in
+# parallel without talking to each other.
+import argparse
+import hashlib
 import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, event, func, insert, select, text
+from sqlalchemy.engine import Engine, make_url
 from sqlmodel import SQLModel
+
 from model import (
     Student,
     Teacher,
@@ -16,274 +36,355 @@ from model import (
     ClassGrades,
 )
 
-
 load_dotenv("config.env")
-engine = create_engine(os.getenv("DATABASE_URL"))
-SQLModel.metadata.create_all(engine)
 
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+# rows per INSERT and per flush; a flush is one short transaction
+INSERT_BATCH_SIZE = int(os.getenv("POPULATE_BATCH_SIZE", "10000"))
+FLUSH_BYTES = 64 * 2**20
+PEOPLE_PARTITION = 50_000
+CLASS_PARTITION = 500
 
-def get_session() -> Session:
-    return Session(engine)
+ASSIGNMENTS_PER_CLASS = 4
+SUBMIT_RATE = 0.8
+GRADE_RATE = 0.7
+CLASS_GRADE_RATE = 0.5
+STUDENT_LIMITS = [20, 30, 40, 60]
+# parent tables first so foreign keys hold inside every flush
+CLASS_TABLES = [Class, Enrollment, Assignment, AssignmentSubmission, AssignmentGrade, ClassGrades]
 
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elena", "Felipe", "Gabriela", "Hugo", "Isabel", "João",
+               "Karina", "Lucas", "Mariana", "Nicolas", "Olivia", "Pedro", "Rafaela", "Samuel", "Tatiana", "Vitor"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues", "Almeida",
+              "Nascimento", "Carvalho", "Araújo", "Ribeiro", "Martins", "Barbosa", "Rocha", "Dias", "Moreira", "Gomes"]
+SUBJECT_AREAS = ["Math", "Physics", "Chemistry", "Biology", "History", "Geography", "English", "Literature",
+                 "Computer Science", "Economics", "Philosophy", "Art"]
+QUALIFICATIONS = ["BSc", "MSc", "PhD"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SEMESTERS = [f"{n}st" for n in range(1, 11)]
+COMMENTS = [None, "on time", "late", "resubmitted", "see attached"]
+EPOCH = datetime(2023, 1, 1)
 
-# generate instances of all models to populate the database
-# teacher
-teacher1 = Teacher(
-    name="John Doe",
-    age=30,
-    email="john@gmail.com",
-    qualification="MSc",
-    entry_date="2021-01-01",
-)
-teacher2 = Teacher(
-    name="Jane Doe",
-    age=35,
-    email="jon@gmail.com",
-    qualification="PhD",
-    entry_date="2021-01-01",
-)
-teacher3 = Teacher(
-    name="Tom Doe",
-    age=25,
-    email="tom@gmail.com",
-    qualification="BSc",
-    entry_date="2024-05-05",
-)
-teacher4 = Teacher(
-    name="Jerry Doe",
-    age=40,
-    email="jerry@hotmail.com",
-    qualification="MSc",
-    entry_date="2023-02-05",
-)
-teacher5 = Teacher(
-    name="Alice Doe",
-    age=29,
-    email="alice@yahoo.com",
-    qualification="PhD",
-    entry_date="2022-01-01",
-)
-teacher6 = Teacher(
-    name="Bob Doe",
-    age=33,
-    email="bob@yahoo.com",
-    qualification="BSc",
-    entry_date="2025-01-01",
-)
 
-# student
-student1 = Student(
-    name="Alice",
-    age=20,
-    semester="1st",
-    entry_date="2021-01-01",
-)
-student2 = Student(
-    name="Bob",
-    age=20,
-    semester="1st",
-    entry_date="2021-01-01",
-)
-student3 = Student(
-    name="Charlie",
-    age=18,
-    semester="8st",
-    entry_date="2023-04-01",
-)
-student4 = Student(
-    name="David",
-    age=19,
-    semester="6st",
-    entry_date="2024-03-01",
-)
-student5 = Student(
-    name="Eve",
-    age=20,
-    semester="2st",
-    entry_date="2023-08-11",
-)
-student6 = Student(
-    name="Frank",
-    age=21,
-    semester="4st",
-    entry_date="2020-03-12",
-)
+class Plan(NamedTuple):
+    seed: int
+    students: int
+    teachers: int
+    subjects: int
+    classes: int
+    blob_size: int = 0
+    blob_fraction: float = 0.0
 
-# subject
-subject1 = Subject(
-    name="Math", syllabus="Algebra", code="MATH101", workload=4, prerequisite="None"
-)
-subject2 = Subject(
-    name="Science", syllabus="Physics", code="SCI101", workload=4, prerequisite="None"
-)
-subject3 = Subject(
-    name="English", syllabus="Grammar", code="ENG101", workload=4, prerequisite="None"
-)
-subject4 = Subject(
-    name="History", syllabus="World History", code="HIST101", workload=4, prerequisite="None"
-)
-subject5 = Subject(
-    name="Computer Science", syllabus="Python", code="CS101", workload=4, prerequisite="None"
-)
-subject6 = Subject(
-    name="Biology", syllabus="Anatomy", code="BIO101", workload=4, prerequisite="None"
-)
 
-# class
-class1 = Class(subject_id=1, teacher_id=1, student_limit=20, schedule="Monday 9-11")
-class2 = Class(subject_id=2, teacher_id=2, student_limit=20, schedule="Tuesday 9-11")
-class3 = Class(subject_id=3, teacher_id=1, student_limit=20, schedule="Wednesday 9-11")
-class4 = Class(subject_id=4, teacher_id=4, student_limit=20, schedule="Thursday 9-11")
-class5 = Class(subject_id=5, teacher_id=5, student_limit=20, schedule="Friday 9-11")
-class6 = Class(subject_id=6, teacher_id=6, student_limit=20, schedule="Saturday 9-11")
-
-# assignment
-assignment1 = Assignment(
-    class_id=1,
-    description="Assignment 1",
-    due_date="2021-01-01",
-    created_at="2021-01-01",
-)
-assignment2 = Assignment(
-    class_id=2,
-    description="Assignment 2",
-    due_date="2021-01-01",
-    created_at="2021-01-01",
-)
-assignment3 = Assignment(
-    class_id=3,
-    description="Assignment 3",
-    due_date="2022-11-12",
-    created_at="2022-11-12",
-)
-assignment4 = Assignment(
-    class_id=4,
-    description="Assignment 4",
-    due_date="2023-09-05",
-    created_at="2023-09-05",
-)
-assignment5 = Assignment(
-    class_id=5,
-    description="Assignment 5",
-    due_date="2024-03-22",
-    created_at="2024-03-22",
-)
-assignment6 = Assignment(
-    class_id=6,
-    description="Assignment 6",
-    due_date="2025-01-14",
-    created_at="2025-01-14",
-)
+def parse_scale(value: str) -> int:
+    # 10k, 1m, 2.5m or a plain number
+    value = value.lower()
+    if value[-1:] in SUFFIXES:
+        return int(float(value[:-1]) * SUFFIXES[value[-1]])
+    return int(value)
+
+
+def plan_for(rows: int, seed: int, blob_size: int = 0, blob_fraction: float = 0.0) -> Plan:
+    # per student: 1 row, ~2.8 enrollments, ~9 submissions, ~6.3 grades and ~1.4 class grades
+    students = max(rows // 22, 10)
+    return Plan(
+        seed=seed,
+        students=students,
+        teachers=max(students // 25, 1),
+        subjects=max(students // 100, 1),
+        classes=max(students * 3 // 30, 1),
+        blob_size=blob_size,
+        blob_fraction=blob_fraction,
+    )
+
+
+def _rng(plan: Plan, *parts) -> random.Random:
+    return random.Random(":".join(map(str, (plan.seed, *parts))))
+
+
+def _date(rng: random.Random) -> datetime:
+    return EPOCH + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+
+
+def teacher_row(rng: random.Random, n: int) -> dict:
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(25, 65),
+        "email": f"teacher{n}@school.edu",
+        "qualification": rng.choice(QUALIFICATIONS),
+        "entry_date": _date(rng).date().isoformat(),
+    }
+
+
+def student_row(rng: random.Random, n: int) -> dict:
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(17, 40),
+        "semester": rng.choice(SEMESTERS),
+        "entry_date": _date(rng).date().isoformat(),
+    }
+
+
+def subject_row(rng: random.Random, n: int) -> dict:
+    area = rng.choice(SUBJECT_AREAS)
+    return {
+        "name": f"{area} {n}",
+        "syllabus": f"Introduction to {area.lower()}, part {n}",
+        "code": f"{area[:3].upper()}{n:06d}",
+        "workload": rng.choice([2, 4, 6]),
+        "prerequisite": "None",
+    }
+
+
+def class_row(rng: random.Random, subjects: int, teachers: int) -> dict:
+    hour = rng.randrange(7, 20)
+    return {
+        "subject_id": rng.randint(1, subjects),
+        "teacher_id": rng.randint(1, teachers),
+        "student_limit": rng.choice(STUDENT_LIMITS),
+        "schedule": f"{rng.choice(WEEKDAYS)} {hour}-{hour + 2}",
+    }
+
+
+def assignment_row(rng: random.Random, class_id: int) -> dict:
+    created = _date(rng)
+    return {
+        "class_id": class_id,
+        "description": f"Assignment for class {class_id}",
+        "due_date": (created + timedelta(days=rng.randint(3, 30))).date().isoformat(),
+        "created_at": created.date().isoformat(),
+    }
+
+
+def submission_row(rng: random.Random, student_id: int, assignment_id: int) -> dict:
+    return {
+        "student_id": student_id,
+        "assignment_id": assignment_id,
+        "submission_date": _date(rng),
+        "comments": rng.choice(COMMENTS),
+    }
+
+
+def _class_seats(rng: random.Random, plan: Plan) -> Tuple[int, int]:
+    # first draws of every class stream, shared by the offset pass and the generator
+    limit = rng.choice(STUDENT_LIMITS)
+    return limit, min(rng.randint(limit // 2, limit), plan.students)
+
+
+def class_offsets(plan: Plan) -> List[Tuple[int, int, int]]:
+    # (first class id, last class id, enrollments before the partition)
+    partitions = []
+    enrolled = 0
+    for first in range(1, plan.classes + 1, CLASS_PARTITION):
+        last = min(first + CLASS_PARTITION - 1, plan.classes)
+        partitions.append((first, last, enrolled))
+        enrolled += sum(_class_seats(_rng(plan, "class", c), plan)[1] for c in range(first, last + 1))
+    return partitions
+
+
+_engines: Dict[str, Engine] = {}
+
+
+def _engine(database_url: str) -> Engine:
+    # one engine per worker process
+    if database_url not in _engines:
+        url = make_url(database_url)
+        if url.get_backend_name() == "sqlite":
+            # workers take turns on the write lock, so they may wait for a while
+            engine = create_engine(url, connect_args={"timeout": 600})
+            event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA synchronous=OFF"))
+        else:
+            engine = create_engine(url)
+        _engines[database_url] = engine
+    return _engines[database_url]
+
+
+def _flush(database_url: str, buffers: Dict, order: List) -> Dict[str, int]:
+    counts = {}
+    with _engine(database_url).begin() as connection:
+        for model in order:
+            rows = buffers.get(model)
+            if not rows:
+                continue
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                connection.execute(insert(model.__table__), rows[start:start + INSERT_BATCH_SIZE])
+            counts[model.__tablename__] = len(rows)
+            rows.clear()
+    return counts
+
+
+def _add_counts(total: Dict[str, int], counts: Dict[str, int]) -> None:
+    for table, count in counts.items():
+        total[table] = total.get(table, 0) + count
+
+
+PEOPLE = {
+    "teacher": (Teacher, teacher_row),
+    "subject": (Subject, subject_row),
+    "student": (Student, student_row),
+}
+
+
+def people_partition(database_url: str, plan: Plan, table: str, first: int, last: int) -> Dict[str, int]:
+    model, make_row = PEOPLE[table]
+    rng = _rng(plan, table, first)
+    rows = [dict(make_row(rng, n), id=n) for n in range(first, last + 1)]
+    return _flush(database_url, {model: rows}, [model])
+
+
+def _classes(plan: Plan, first: int, last: int, enrolled: int) -> Iterator[Tuple[object, dict]]:
+    for class_id in range(first, last + 1):
+        rng = _rng(plan, "class", class_id)
+        limit, seats = _class_seats(rng, plan)
+        students = rng.sample(range(1, plan.students + 1), seats)
+        yield Class, dict(class_row(rng, plan.subjects, plan.teachers), id=class_id, student_limit=limit, enrolled_count=seats)
+
+        assignments = []
+        for k in range(ASSIGNMENTS_PER_CLASS):
+            assignment = dict(assignment_row(rng, class_id), id=(class_id - 1) * ASSIGNMENTS_PER_CLASS + k + 1)
+            assignments.append(assignment)
+            yield Assignment, assignment
+        created = [datetime.fromisoformat(assignment["created_at"]) for assignment in assignments]
+
+        for student_id in students:
+            enrolled += 1
+            yield Enrollment, {"student_id": student_id, "class_id": class_id}
+            if rng.random() < CLASS_GRADE_RATE:
+                yield ClassGrades, {"id": enrolled, "student_id": student_id, "class_id": class_id,
+                                    "grade": round(rng.uniform(0, 10), 1)}
+            for k, assignment in enumerate(assignments):
+                if rng.random() >= SUBMIT_RATE:
+                    continue
+                # one id slot per (enrollment, assignment), left empty when nothing was submitted
+                submission_id = (enrolled - 1) * ASSIGNMENTS_PER_CLASS + k + 1
+                submission = {
+                    "id": submission_id,
+                    "student_id": student_id,
+                    "assignment_id": assignment["id"],
+                    "submission_date": created[k] + timedelta(minutes=rng.randrange(30 * 24 * 60)),
+                    "comments": rng.choice(COMMENTS),
+                    # executemany takes its columns from the first row, so every row has all keys
+                    "submission_file": None,
+                    "file_size": None,
+                    "file_hash": None,
+                }
+                if plan.blob_size and rng.random() < plan.blob_fraction:
+                    blob = rng.randbytes(plan.blob_size)
+                    submission.update(submission_file=blob, file_size=len(blob),
+                                      file_hash=hashlib.sha256(blob).hexdigest())
+                yield AssignmentSubmission, submission
+                if rng.random() < GRADE_RATE:
+                    yield AssignmentGrade, {"id": submission_id, "submission_id": submission_id,
+                                            "grade": round(rng.uniform(0, 10), 1)}
+
+
+def class_partition(database_url: str, plan: Plan, first: int, last: int, enrolled: int) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    buffers: Dict = {model: [] for model in CLASS_TABLES}
+    buffered = 0
+    for model, row in _classes(plan, first, last, enrolled):
+        buffers[model].append(row)
+        buffered += len(row.get("submission_file") or b"") + 1
+        if buffered >= FLUSH_BYTES or len(buffers[model]) >= INSERT_BATCH_SIZE:
+            _add_counts(counts, _flush(database_url, buffers, CLASS_TABLES))
+            buffered = 0
+    _add_counts(counts, _flush(database_url, buffers, CLASS_TABLES))
+    return counts
+
+
+def _run(tasks: List[Tuple], workers: int, totals: Dict[str, int]) -> None:
+    if workers <= 1:
+        for task, *args in tasks:
+            _add_counts(totals, task(*args))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for counts in pool.map(_call, tasks):
+            _add_counts(totals, counts)
+
+
+def _call(task: Tuple) -> Dict[str, int]:
+    function, *args = task
+    return function(*args)
+
+
+def _finish(engine: Engine) -> None:
+    from sqlalchemy.orm import Session
+
+    from summary import rebuild_student_summaries
+
+    if engine.dialect.name == "postgresql":
+        # ids were given explicitly, move the sequences past them
+        with engine.begin() as connection:
+            for table in SQLModel.metadata.sorted_tables:
+                if "id" in table.c and table.c.id.autoincrement is not False and table.c.id.primary_key:
+                    connection.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                        f"coalesce(max(id), 0) + 1, false) FROM \"{table.name}\""
+                    ))
+    with Session(engine) as session:
+        rebuild_student_summaries(session)
+        session.commit()
+
+
+def generate(database_url: str, plan: Plan, workers: int = 1) -> Dict[str, int]:
+    engine = _engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as connection:
+        if connection.scalar(select(func.count()).select_from(Student)):
+            raise SystemExit("the database already has data, pass --reset to replace it")
+    # forked workers must not inherit open connections
+    engine.dispose()
+
+    totals: Dict[str, int] = {}
+    people = [
+        (people_partition, database_url, plan, table, first, min(first + PEOPLE_PARTITION - 1, count))
+        for table, count in (("teacher", plan.teachers), ("subject", plan.subjects), ("student", plan.students))
+        for first in range(1, count + 1, PEOPLE_PARTITION)
+    ]
+    _run(people, workers, totals)
+    classes = [(class_partition, database_url, plan, *offsets) for offsets in class_offsets(plan)]
+    _run(classes, workers, totals)
+    _finish(engine)
+    return totals
+
+
+def reset(database_url: str) -> None:
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        # dropping the tables would leave the FTS shadow tables behind
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(url.database + suffix):
+                os.remove(url.database + suffix)
+        return
+    SQLModel.metadata.drop_all(_engine(database_url))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fill the database with a consistent synthetic dataset.")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--rows", type=parse_scale, default="10k", help="approximate total rows: 10k, 1m, 10m or a number")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--blob-size", type=int, default=0, help="bytes per submission file")
+    parser.add_argument("--blob-fraction", type=float, default=0.0, help="share of submissions that carry a file")
+    parser.add_argument("--reset", action="store_true", help="drop the existing data first")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+    # summary.py builds its engine from DATABASE_URL
+    os.environ["DATABASE_URL"] = args.database_url
+
+    if args.reset:
+        reset(args.database_url)
+    plan = plan_for(args.rows, args.seed, args.blob_size, args.blob_fraction)
+    start = time.perf_counter()
+    totals = generate(args.database_url, plan, args.workers)
+    elapsed = time.perf_counter() - start
+    for table, count in totals.items():
+        print(f"{table:<22} {count:>12,}", file=sys.stderr)
+    total = sum(totals.values())
+    print(f"{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)", file=sys.stderr)
 
-# assignment submission
-assignment_submission1 = AssignmentSubmission(
-    student_id=1, assignment_id=1, submission_date=datetime.fromisoformat("2021-01-01"), comments="Good job!"
-)
-assignment_submission2 = AssignmentSubmission(
-    student_id=2, assignment_id=2, submission_date=datetime.fromisoformat("2021-01-01"), comments="Good job!"
-)
-assignment_submission3 = AssignmentSubmission(
-    student_id=1, assignment_id=3, submission_date=datetime.fromisoformat("2021-01-01"), comments="Good job!"
-)
-assignment_submission4 = AssignmentSubmission(
-    student_id=2, assignment_id=4, submission_date=datetime.fromisoformat("2021-01-01"), comments="Good job!"
-)
-assignment_submission5 = AssignmentSubmission(
-    student_id=1, assignment_id=5, submission_date=datetime.fromisoformat("2022-11-12"), comments="Good job!"
-)
-assignment_submission6 = AssignmentSubmission(
-    student_id=2, assignment_id=6, submission_date=datetime.fromisoformat("2022-11-12"), comments="Good job!"
-)
 
-# assignment grade
-assignment_grade1 = AssignmentGrade(submission_id=1, grade=100)
-assignment_grade2 = AssignmentGrade(submission_id=2, grade=90)
-assignment_grade3 = AssignmentGrade(submission_id=3, grade=80)
-assignment_grade4 = AssignmentGrade(submission_id=4, grade=70)
-assignment_grade5 = AssignmentGrade(submission_id=5, grade=60)
-assignment_grade6 = AssignmentGrade(submission_id=6, grade=50)
-
-# enrollment
-enrollment1 = Enrollment(student_id=1, class_id=1)
-enrollment2 = Enrollment(student_id=2, class_id=1)
-enrollment3 = Enrollment(student_id=3, class_id=3)
-enrollment4 = Enrollment(student_id=4, class_id=4)
-enrollment5 = Enrollment(student_id=5, class_id=5)
-enrollment6 = Enrollment(student_id=6, class_id=6)
-
-# class grades
-class_grades1 = ClassGrades(class_id=1, student_id=1, grade=100)
-class_grades2 = ClassGrades(class_id=1, student_id=2, grade=90)
-class_grades3 = ClassGrades(class_id=3, student_id=3, grade=80)
-class_grades4 = ClassGrades(class_id=4, student_id=4, grade=70)
-class_grades5 = ClassGrades(class_id=5, student_id=5, grade=60)
-class_grades6 = ClassGrades(class_id=6, student_id=6, grade=50)
-
-session = get_session()
-
-session.add(student1)
-session.add(student2)
-session.add(student3)
-session.add(student4)
-session.add(student5)
-session.add(student6)
-session.commit()
-
-session.add(teacher1)
-session.add(teacher2)
-session.add(teacher3)
-session.add(teacher4)
-session.add(teacher5)
-session.add(teacher6)
-
-session.add(subject1)
-session.add(subject2)
-session.add(subject3)
-session.add(subject4)
-session.add(subject5)
-session.add(subject6)
-
-session.add(class1)
-session.add(class2)
-session.add(class3)
-session.add(class4)
-session.add(class5)
-session.add(class6)
-session.commit()
-
-session.add(assignment1)
-session.add(assignment2)
-session.add(assignment3)
-session.add(assignment4)
-session.add(assignment5)
-session.add(assignment6)
-
-session.add(assignment_submission1)
-session.add(assignment_submission2)
-session.add(assignment_submission3)
-session.add(assignment_submission4)
-session.add(assignment_submission5)
-session.add(assignment_submission6)
-
-session.add(assignment_grade1)
-session.add(assignment_grade2)
-session.add(assignment_grade3)
-session.add(assignment_grade4)
-session.add(assignment_grade5)
-session.add(assignment_grade6)
-
-session.add(enrollment1)
-session.add(enrollment2)
-session.add(enrollment3)
-session.add(enrollment4)
-session.add(enrollment5)
-session.add(enrollment6)
-
-session.add(class_grades1)
-session.add(class_grades2)
-session.add(class_grades3)
-session.add(class_grades4)
-session.add(class_grades5)
-session.add(class_grades6)
-
-session.commit()
+if __name__ == "__main__":
+    main()
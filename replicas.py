@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ("GET", "HEAD")
+# a client that must see its own writes sends this header, or carries the cookie set after a write
+PRIMARY_HEADER = "x-read-your-writes"
+STICKY_COOKIE = "primary_until"
+STRATEGIES = ("round_robin", "least_connections")
+
+
+class Replica:
+    def __init__(self, url: str, engine: Engine, async_engine: AsyncEngine):
+        self.url = url
+        self.engine = engine
+        self.async_engine = async_engine
+        self.sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False)
+        self.healthy = True
+        self.in_flight = 0
+        self.last_error: Optional[str] = None
+
+
+class ReplicaPool:
+    def __init__(self, replicas: List[Replica], strategy: str = "round_robin", health_interval: float = 10.0):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"READ_REPLICA_STRATEGY must be one of {', '.join(STRATEGIES)}")
+        self.replicas = replicas
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[Replica]:
+        # None means the primary, either because there are no replicas or none is healthy
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_flight)
+        return healthy[next(self._counter) % len(healthy)]
+
+    @contextmanager
+    def using(self, replica: Optional[Replica]) -> Iterator[None]:
+        if replica is None:
+            yield
+            return
+        with self._lock:
+            replica.in_flight += 1
+        try:
+            yield
+        except (OperationalError, InterfaceError) as e:
+            # taken out until the next health check finds it answering again
+            self._mark(replica, False, str(e))
+            raise
+        finally:
+            with self._lock:
+                replica.in_flight -= 1
+
+    def _mark(self, replica: Replica, healthy: bool, error: Optional[str] = None) -> None:
+        if replica.healthy != healthy:
+            logger.warning("read replica %s is %s%s", replica.engine.url, "up" if healthy else "down",
+                           f": {error}" if error else "")
+        replica.healthy = healthy
+        replica.last_error = error
+
+    async def check(self) -> None:
+        for replica in self.replicas:
+            try:
+                async with replica.async_engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+                self._mark(replica, True)
+            except Exception as e:
+                self._mark(replica, False, str(e))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        if self.replicas and self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+            replica.engine.dispose()
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.healthy,
+                "in_flight": replica.in_flight,
+                "last_error": replica.last_error,
+            }
+            for replica in self.replicas
+        ]
+
+
+def wants_primary(request: Request) -> bool:
+    if request.method not in READ_METHODS:
+        return True
+    if request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class StickyPrimaryMiddleware:
+    # after a successful write the client reads from the primary for `seconds`,
+    # which covers the replication lag of its own writes
+    def __init__(self, app: ASGIApp, seconds: float):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or self.seconds <= 0:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{STICKY_COOKIE}={time.time() + self.seconds:.3f}; Max-Age={int(self.seconds) + 1}; Path=/; SameSite=Lax"
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())])
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
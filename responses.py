@@ -0,0 +1,57 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fast mode selects only the columns of a *Public schema as plain rows and
+# serializes them in one go, skipping ORM instances and per-object pydantic
+# validation. Nested schemas are selected through a join and labelled
+# "<field>__<column>", which shape_row() folds back into nested dicts.
+
+
+def shape_columns(model: Type[Any], schema: Type[Any], **nested: Tuple[Type[Any], Type[Any]]) -> List[Any]:
+    table = model.__table__
+    columns = []
+    for name in schema.__fields__:
+        if name in nested:
+            related_model, related_schema = nested[name]
+            columns.extend(
+                column.label(f"{name}__{column.key}")
+                for column in shape_columns(related_model, related_schema)
+            )
+        elif name in table.columns:
+            columns.append(table.columns[name])
+    return columns
+
+
+def shape_row(row: Any) -> Dict[str, Any]:
+    shaped: Dict[str, Any] = {}
+    for key, value in zip(row._fields, row):
+        *path, leaf = key.split("__")
+        target = shaped
+        for part in path:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return shaped
+
+
+def group_rows(rows: Iterable[Any], key: str) -> Dict[Any, List[Dict[str, Any]]]:
+    # key is a selected column that only serves the grouping and is dropped
+    groups: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        shaped = shape_row(row)
+        groups[shaped.pop(key)].append(shaped)
+    return groups
+
+
+def fast_page(page: dict) -> JSONResponse:
+    page["data"] = [row if isinstance(row, dict) else shape_row(row) for row in page["data"]]
+    if orjson is None:
+        return JSONResponse(jsonable_encoder(page))
+    return ORJSONResponse(page)
@@ -0,0 +1,49 @@
+import sqlite3
+from typing import Any, Callable, List, Tuple
+
+from sqlalchemy import Select, case, or_, select, text
+
+from model import Student
+from pagination import SortKey
+
+# FTS5 trigram MATCH needs at least one full trigram
+MIN_TRIGRAM_LENGTH = 3
+
+
+def _name_match(dialect: str, q: str):
+    contains = Student.name.icontains(q, autoescape=True)
+    if dialect == "postgresql":
+        # both operators are served by the gin_trgm_ops index
+        return or_(contains, Student.name.op("%")(q))
+    if dialect == "sqlite" and len(q) >= MIN_TRIGRAM_LENGTH and sqlite3.sqlite_version_info >= (3, 34):
+        phrase = '"' + q.replace('"', '""') + '"'
+        matches = select(text("rowid")).select_from(text("student_fts")).where(
+            text("student_fts MATCH :phrase").bindparams(phrase=phrase)
+        )
+        return Student.id.in_(matches)
+    return contains
+
+
+def _rank_value(q: str) -> Callable[[Any], int]:
+    lowered = q.lower()
+
+    def value(student: Student) -> int:
+        name = student.name.lower()
+        if name.startswith(lowered):
+            return 0
+        return 1 if lowered in name else 2
+
+    return value
+
+
+def student_search(dialect: str, q: str) -> Tuple[Select, List[SortKey]]:
+    q = q.strip()
+    # prefix matches first, then substring matches, then fuzzy (PostgreSQL only)
+    rank = case(
+        (Student.name.istartswith(q, autoescape=True), 0),
+        (Student.name.icontains(q, autoescape=True), 1),
+        else_=2,
+    )
+    statement = select(Student).where(_name_match(dialect, q))
+    keys = [SortKey(rank, value=_rank_value(q)), SortKey(Student.name), SortKey(Student.id)]
+    return statement, keys
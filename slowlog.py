@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from instrumentation import current_stats, on_query
+
+load_dotenv("config.env")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(10 * 2**20)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+# off, plan or analyze; analyze runs the statement again, so it is only used for reads
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "plan")
+# a fingerprint is explained at most once per interval
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60"))
+
+SORT_KEYS = ("total_ms", "count", "max_ms", "avg_ms")
+EXPLAIN_PREFIXES = {
+    "sqlite": ("EXPLAIN QUERY PLAN ", None),
+    "postgresql": ("EXPLAIN (FORMAT JSON) ", "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "),
+    "mysql": ("EXPLAIN FORMAT=JSON ", "EXPLAIN ANALYZE "),
+    "mariadb": ("EXPLAIN FORMAT=JSON ", "ANALYZE FORMAT=JSON "),
+}
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+READS = ("SELECT", "WITH")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    # literals and placeholders become ?, and IN lists of any length collapse into one
+    normalized = _STRING.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _LIST.sub("(?+)", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+def fingerprint(statement: str) -> Tuple[str, str]:
+    normalized = normalize(statement)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized
+
+
+def _param(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > 200:
+        return value[:200] + "..."
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _params(parameters: Any, executemany: bool) -> Any:
+    if executemany:
+        return {"executemany": len(parameters), "first": _params(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: _param(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_param(value) for value in parameters]
+    return _param(parameters)
+
+
+def _plan(dialect: str, rows: List[Any]) -> Any:
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    if len(rows) == 1 and len(rows[0]) == 1:
+        value = rows[0][0]
+        if isinstance(value, str) and value[:1] in "[{":
+            return json.loads(value)
+        return value
+    return [list(row) for row in rows]
+
+
+class SlowQueryLog:
+    def __init__(self, path: str, threshold_ms: float, explain: str = "plan",
+                 max_bytes: int = SLOW_QUERY_LOG_BYTES, backups: int = SLOW_QUERY_LOG_BACKUPS):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.logger = logging.getLogger("slow_queries")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+        self.backups = backups
+        self._async_engines: Dict[Engine, AsyncEngine] = {}
+        self._explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self._tasks: Set[asyncio.Task] = set()
+
+    def install(self, *engines: Any) -> None:
+        # async engines are explained through themselves, their statements use their driver's paramstyle
+        for engine in engines:
+            if isinstance(engine, AsyncEngine):
+                self._async_engines[engine.sync_engine] = engine
+        on_query(self.record)
+
+    def record(self, conn: Connection, statement: str, parameters: Any, context: Any, elapsed: float) -> None:
+        if elapsed < self.threshold or statement.lstrip()[:7].upper().startswith("EXPLAIN"):
+            return
+        fp, normalized = fingerprint(statement)
+        stats = current_stats()
+        executemany = bool(getattr(context, "executemany", False))
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "fingerprint": fp,
+            "duration_ms": round(elapsed * 1000, 3),
+            "endpoint": stats.endpoint if stats is not None else None,
+            "statement": statement,
+            "normalized": normalized,
+            "parameters": _params(parameters, executemany),
+        }
+        prefix = self._explain_prefix(conn.dialect.name, statement)
+        if prefix is None or executemany or not self._due(fp):
+            return self._write(entry)
+        async_engine = self._async_engines.get(conn.engine)
+        if async_engine is not None:
+            # the listener runs in a greenlet on the event loop thread; an empty
+            # context keeps the EXPLAIN out of the request's query count
+            coroutine = self._explain_async(async_engine, prefix, statement, parameters, entry)
+            task = contextvars.Context().run(asyncio.get_running_loop().create_task, coroutine)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._executor.submit(self._explain_sync, conn.engine, prefix, statement, parameters, entry)
+
+    def _explain_prefix(self, dialect: str, statement: str) -> Optional[str]:
+        if self.explain not in ("plan", "analyze") or dialect not in EXPLAIN_PREFIXES:
+            return None
+        verb = statement.lstrip()[:6].upper()
+        if not verb.startswith(EXPLAINABLE):
+            return None
+        plan, analyze = EXPLAIN_PREFIXES[dialect]
+        if self.explain == "analyze" and analyze is not None and verb.startswith(READS):
+            return analyze
+        return plan
+
+    def _due(self, fp: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(fp, float("-inf")) < SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self._explained[fp] = now
+            return True
+
+    def _explain_sync(self, engine: Engine, prefix: str, statement: str, parameters: Any, entry: dict) -> None:
+        try:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+            entry["plan"] = _plan(engine.dialect.name, rows)
+        except Exception as e:
+            entry["explain_error"] = str(e)
+        self._write(entry)
+
+    async def _explain_async(self, engine: AsyncEngine, prefix: str, statement: str, parameters: Any, entry: dict) -> None:
+        try:
+            async with engine.connect() as connection:
+                rows = (await connection.exec_driver_sql(prefix + statement, parameters)).all()
+            entry["plan"] = _plan(engine.dialect.name, rows)
+        except Exception as e:
+            entry["explain_error"] = str(e)
+        self._write(entry)
+
+    def _write(self, entry: dict) -> None:
+        self.logger.info(json.dumps(entry, default=str))
+
+    def _files(self) -> List[str]:
+        # oldest first, so the newest plan of a fingerprint wins
+        files = [f"{self.path}.{n}" for n in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in files if os.path.exists(path)]
+
+    def aggregate(self, sort: str = "total_ms", limit: int = 20) -> List[dict]:
+        groups: Dict[str, dict] = {}
+        for path in self._files():
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    group = groups.setdefault(entry["fingerprint"], {
+                        "fingerprint": entry["fingerprint"],
+                        "normalized": entry["normalized"],
+                        "count": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "endpoints": {},
+                        "last_seen": None,
+                        "plan": None,
+                    })
+                    group["count"] += 1
+                    group["total_ms"] += entry["duration_ms"]
+                    group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+                    group["last_seen"] = entry["time"]
+                    endpoint = entry.get("endpoint") or "-"
+                    group["endpoints"][endpoint] = group["endpoints"].get(endpoint, 0) + 1
+                    group["example"] = {"statement": entry["statement"], "parameters": entry["parameters"]}
+                    if "plan" in entry:
+                        group["plan"] = entry["plan"]
+        for group in groups.values():
+            group["total_ms"] = round(group["total_ms"], 3)
+            group["avg_ms"] = round(group["total_ms"] / group["count"], 3)
+        return sorted(groups.values(), key=lambda group: group[sort], reverse=True)[:limit]
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_LOG, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN) if SLOW_QUERY_LOG else None
@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import Select, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import engine
+from events import on_write
+from jobs import JobError, enqueue, job_handler
+from model import (
+    Student,
+    Subject,
+    Class,
+    AssignmentSubmission,
+    AssignmentGrade,
+    Enrollment,
+    ClassGrades,
+    StudentSummary,
+)
+
+REFRESH_BATCH_SIZE = 500
+
+SUMMARY_COLUMNS = ["student_id", "total_workload", "class_count", "class_grade_avg", "assignment_grade_avg"]
+
+
+def summary_select() -> Select:
+    # one row per student, each aggregate correlated on student.id and served by its index
+    total_workload = (
+        select(func.coalesce(func.sum(Subject.workload), 0))
+        .select_from(Enrollment)
+        .join(Class, Class.id == Enrollment.class_id)
+        .join(Subject, Subject.id == Class.subject_id)
+        .where(Enrollment.student_id == Student.id)
+        .scalar_subquery()
+    )
+    class_count = select(func.count()).select_from(Enrollment).where(Enrollment.student_id == Student.id).scalar_subquery()
+    class_grade_avg = select(func.avg(ClassGrades.grade)).where(ClassGrades.student_id == Student.id).scalar_subquery()
+    assignment_grade_avg = (
+        select(func.avg(AssignmentGrade.grade))
+        .join(AssignmentSubmission, AssignmentSubmission.id == AssignmentGrade.submission_id)
+        .where(AssignmentSubmission.student_id == Student.id)
+        .scalar_subquery()
+    )
+    return select(Student.id, total_workload, class_count, class_grade_avg, assignment_grade_avg)
+
+
+def refresh_student_summaries(session: Session, student_ids: Iterable[int]) -> None:
+    ids = sorted(set(student_ids))
+    for start in range(0, len(ids), REFRESH_BATCH_SIZE):
+        batch = ids[start:start + REFRESH_BATCH_SIZE]
+        session.execute(delete(StudentSummary).where(StudentSummary.student_id.in_(batch)))
+        session.execute(
+            insert(StudentSummary).from_select(SUMMARY_COLUMNS, summary_select().where(Student.id.in_(batch)))
+        )
+
+
+def rebuild_student_summaries(session: Session) -> None:
+    session.execute(delete(StudentSummary))
+    session.execute(insert(StudentSummary).from_select(SUMMARY_COLUMNS, summary_select()))
+
+
+async def load_student_summaries(session: AsyncSession, student_ids: Sequence[int]) -> List[Dict]:
+    summaries = {
+        summary.student_id: {column: getattr(summary, column) for column in SUMMARY_COLUMNS}
+        for summary in await session.scalars(
+            select(StudentSummary).where(StudentSummary.student_id.in_(student_ids))
+        )
+    }
+    missing = [student_id for student_id in student_ids if student_id not in summaries]
+    if missing:
+        # students written before the summary table existed are computed on the fly
+        for row in await session.execute(summary_select().where(Student.id.in_(missing))):
+            summaries[row[0]] = dict(zip(SUMMARY_COLUMNS, row))
+    return [summaries[student_id] for student_id in student_ids if student_id in summaries]
+
+
+SUMMARY_MODELS = {
+    model.__tablename__: model
+    for model in (Student, Subject, Class, AssignmentSubmission, AssignmentGrade, Enrollment, ClassGrades)
+}
+
+
+def _row_key(model, row) -> int:
+    # what a written row is remembered by until the refresh job runs
+    if model in (Student, Class, Subject):
+        return row.id
+    if model is AssignmentGrade:
+        return row.submission_id
+    return row.student_id
+
+
+def _affected_students(session: Session, model, keys: List[int]) -> Set[int]:
+    if model in (Student, Enrollment, ClassGrades, AssignmentSubmission):
+        return set(keys)
+    if model is AssignmentGrade:
+        return set(session.scalars(
+            select(AssignmentSubmission.student_id).where(AssignmentSubmission.id.in_(keys))
+        ))
+    if model is Class:
+        return set(session.scalars(select(Enrollment.student_id).where(Enrollment.class_id.in_(keys))))
+    return set(session.scalars(
+        select(Enrollment.student_id)
+        .join(Class, Class.id == Enrollment.class_id)
+        .where(Class.subject_id.in_(keys))
+    ))
+
+
+@job_handler("rebuild_student_summaries")
+def rebuild_summaries_job(payload) -> dict:
+    with Session(engine) as session:
+        rebuild_student_summaries(session)
+        session.commit()
+        return {"students": session.scalar(select(func.count()).select_from(StudentSummary))}
+
+
+@job_handler("refresh_student_summaries")
+def refresh_summaries_job(payload) -> dict:
+    # {"table": "enrollment", "keys": [...]}, enqueued by _refresh_on_write
+    model = SUMMARY_MODELS.get((payload or {}).get("table"))
+    keys = (payload or {}).get("keys")
+    if model is None or not isinstance(keys, list):
+        raise JobError("payload must name a summary table and its written keys")
+    with Session(engine) as session:
+        students = _affected_students(session, model, keys)
+        refresh_student_summaries(session, students)
+        session.commit()
+    return {"students": len(students)}
+
+
+@on_write
+def _refresh_on_write(model, rows) -> None:
+    # the write is already committed; the summaries catch up on the job queue
+    # instead of costing the request their recomputation
+    if model not in SUMMARY_MODELS.values():
+        return
+    with Session(engine) as session:
+        if rows is None:
+            # a whole table changed, so every summary is rebuilt
+            enqueue(session, "rebuild_student_summaries")
+        elif rows:
+            keys = sorted({_row_key(model, row) for row in rows})
+            enqueue(session, "refresh_student_summaries", {"table": model.__tablename__, "keys": keys})
+        session.commit()
@@ -0,0 +1,45 @@
+import os
+import tempfile
+from typing import Callable, List
+
+import pytest
+
+# database.py and the caches read their settings at import time, so these come first
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="school-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ["RESPONSE_CACHE_SIZE"] = "0"
+os.environ["SLOW_QUERY_LOG"] = ""
+os.environ["JOB_WORKERS"] = "0"
+os.environ["READ_REPLICA_URLS"] = ""
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from populate import generate, plan_for  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database() -> str:
+    generate(os.environ["DATABASE_URL"], plan_for(2000, seed=42))
+    return os.environ["DATABASE_URL"]
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from api import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def query_plan(database) -> Callable[..., List[str]]:
+    # the SQLite EXPLAIN QUERY PLAN steps of a statement, bound with its own parameters
+    from database import engine
+
+    def plan(statement) -> List[str]:
+        compiled = statement.compile(dialect=engine.dialect)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        with engine.connect() as connection:
+            return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params)]
+
+    return plan
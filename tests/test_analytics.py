@@ -0,0 +1,167 @@
+import asyncio
+import math
+import statistics
+import time
+from collections import defaultdict
+
+import pytest
+from sqlalchemy.orm import Session
+
+import analytics
+from analytics import GRADE_MAX, GRADE_MIN, SnapshotCache, bin_edges, grade_values, summary_statement
+from database import AsyncSessionLocal, engine
+
+PERCENTILES = [0.1, 0.5, 0.9]
+# edges at 2, 4, 6 and 8, which grades rounded to tenths land on
+BINS = 5
+
+
+def percentile_cont(grades: list, p: float) -> float:
+    # PostgreSQL's definition: linear interpolation between the closest ranks
+    position = p * (len(grades) - 1)
+    low, high = math.floor(position), math.ceil(position)
+    return grades[low] + (grades[high] - grades[low]) * (position - low)
+
+
+def reference(source: str, by: str, percentiles=PERCENTILES) -> dict:
+    with Session(engine) as session:
+        rows = session.execute(grade_values(source, by)).all()
+    groups = defaultdict(list)
+    for grade, group in rows:
+        groups[group].append(grade)
+    inner = bin_edges(BINS)[1:-1]
+    expected = {}
+    for group, grades in groups.items():
+        grades.sort()
+        histogram = [0] * BINS
+        for grade in grades:
+            # below the scale counts in the first bucket, the top of the scale and above in the last
+            histogram[sum(grade >= edge for edge in inner)] += 1
+        expected[group] = {
+            "count": len(grades),
+            "mean": statistics.fmean(grades),
+            "stddev": statistics.stdev(grades) if len(grades) > 1 else None,
+            "min": grades[0],
+            "max": grades[-1],
+            "percentiles": {f"p{p * 100:g}": percentile_cont(grades, p) for p in percentiles},
+            "histogram": histogram,
+        }
+    return expected
+
+
+def assert_matches(data: list, expected: dict) -> None:
+    assert {row["group"] for row in data} == set(expected)
+    for row in data:
+        want = expected[row["group"]]
+        assert (row["count"], row["histogram"]) == (want["count"], want["histogram"])
+        assert sum(row["histogram"]) == row["count"]
+        for name in ("mean", "min", "max"):
+            assert math.isclose(row[name], want[name], abs_tol=1e-9)
+        if want["stddev"] is None:
+            assert row["stddev"] is None
+        else:
+            assert math.isclose(row["stddev"], want["stddev"], rel_tol=1e-9)
+        assert row["percentiles"].keys() == want["percentiles"].keys()
+        for name, value in want["percentiles"].items():
+            assert math.isclose(row["percentiles"][name], value, abs_tol=1e-9)
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    # never serve a snapshot older than the data the reference reads
+    monkeypatch.setattr(analytics.grade_snapshots, "max_stale", 0)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+@pytest.mark.parametrize("source, by", [("class_grades", "class"), ("assignment_grade", "subject"), ("class_grades", "semester")])
+def test_distributions_match_a_python_reference(client, fresh, monkeypatch, numpy, source, by):
+    if numpy and analytics.np is None:
+        pytest.skip("needs numpy")
+    if not numpy:
+        monkeypatch.setattr(analytics, "np", None)
+        monkeypatch.setattr(analytics, "grade_snapshots", SnapshotCache(max_stale=0))
+    params = {"by": by, "bins": BINS, "percentile": PERCENTILES}
+    response = client.get(f"/analytics/grades/{source}", params=params)
+    assert response.status_code == 200
+    assert_matches(response.json()["data"], reference(source, by))
+
+
+class _StddevSamp:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return statistics.stdev(self.values) if len(self.values) > 1 else None
+
+
+def test_summary_statement_buckets_and_stddev():
+    # the PostgreSQL statement without percentile_cont, which SQLite has no syntax for
+    edges = bin_edges(BINS)
+    statement = summary_statement(grade_values("class_grades", "class"), edges, [])
+    with engine.connect() as connection:
+        connection.connection.driver_connection.create_aggregate("stddev_samp", 1, _StddevSamp)
+        rows = connection.execute(statement).all()
+    data = [
+        {"group": row[0], "count": row[1], "mean": row[2], "stddev": row[3], "min": row[4], "max": row[5],
+         "histogram": list(row[6:]), "percentiles": {}}
+        for row in rows
+    ]
+    assert_matches(data, reference("class_grades", "class", percentiles=[]))
+
+
+def test_edges_cover_the_grade_scale():
+    edges = bin_edges(BINS)
+    assert (edges[0], edges[-1], len(edges)) == (GRADE_MIN, GRADE_MAX, BINS + 1)
+
+
+def test_stale_snapshot_is_served_while_it_reloads(client):
+    cache = SnapshotCache(AsyncSessionLocal, max_stale=60)
+
+    async def run():
+        first = await cache.get("class_grades", "class")
+        cache.invalidate("class_grades")
+        stale = await cache.get("class_grades", "class")
+        loading = cache._loading[("class_grades", "class")]
+        reloading = not loading.done()
+        await loading
+        fresh = await cache.get("class_grades", "class")
+        return first, stale, reloading, fresh
+
+    first, stale, reloading, fresh = client.portal.call(run)
+    assert stale is first
+    assert reloading
+    assert fresh is not first
+    assert fresh.generation == first.generation + 1
+
+
+def test_snapshot_past_max_stale_is_reloaded_before_answering(client):
+    cache = SnapshotCache(AsyncSessionLocal, max_stale=60)
+
+    async def run():
+        first = await cache.get("class_grades", "class")
+        key = ("class_grades", "class")
+        cache._entries[key] = first._replace(loaded_at=time.time() - 61)
+        cache.invalidate("class_grades")
+        reloaded = await cache.get("class_grades", "class")
+        return first, reloaded
+
+    first, reloaded = client.portal.call(run)
+    assert reloaded is not first
+    assert reloaded.generation == first.generation + 1
+    assert reloaded.loaded_at > first.loaded_at
+
+
+def test_unchanged_snapshot_is_not_reloaded(client):
+    cache = SnapshotCache(AsyncSessionLocal, max_stale=0)
+
+    async def run():
+        first = await cache.get("assignment_grade", "class")
+        await asyncio.sleep(0)
+        return first, await cache.get("assignment_grade", "class")
+
+    first, second = client.portal.call(run)
+    assert second is first
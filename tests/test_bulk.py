@@ -0,0 +1,108 @@
+import pytest
+from sqlmodel import Session, select
+
+from bulk import UpsertSpec, iterate_rows, upsert_rows
+from database import AsyncSessionLocal, engine
+from model import ClassGrades, ClassGradesCreate
+
+
+@pytest.fixture
+def class_id(client):
+    return client.post("/class", json={
+        "subject_id": 1, "teacher_id": 1, "student_limit": 10, "schedule": "Tue 8-10",
+    }).json()["id"]
+
+
+def grades(class_id):
+    with Session(engine) as session:
+        return dict(session.exec(select(ClassGrades.student_id, ClassGrades.grade).where(ClassGrades.class_id == class_id)).all())
+
+
+def assert_adds_up(result):
+    assert result["received"] == result["written"] + result["skipped"] + result["failed"]
+
+
+def test_merge_keeps_the_last_duplicate(client, class_id):
+    rows = [
+        {"student_id": 1, "class_id": class_id, "grade": 5},
+        {"student_id": 2, "class_id": class_id, "grade": 6},
+        {"student_id": 1, "class_id": class_id, "grade": 9},
+    ]
+    result = client.post("/class_grades/bulk", json=rows).json()
+    assert_adds_up(result)
+    assert (result["written"], result["skipped"], result["failed"]) == (2, 1, 0)
+    assert result["duplicates"] == [{"index": 0, "duplicate_of": 2}]
+    assert grades(class_id) == {1: 9, 2: 6}
+
+
+def test_do_nothing_keeps_the_first_duplicate(client, class_id):
+    spec = UpsertSpec(ClassGrades, ClassGradesCreate, key=("student_id", "class_id"))
+    rows = [
+        {"student_id": 1, "class_id": class_id, "grade": 5},
+        {"student_id": 1, "class_id": class_id, "grade": 9},
+    ]
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await upsert_rows(session, iterate_rows(rows), spec)
+
+    result = client.portal.call(run)
+    assert_adds_up(result)
+    assert result["duplicates"] == [{"index": 1, "duplicate_of": 0}]
+    assert grades(class_id) == {1: 5}
+
+
+def test_insert_fails_the_repeated_row(client, class_id):
+    rows = [
+        {"student_id": 1, "class_id": class_id},
+        {"student_id": 1, "class_id": class_id},
+        {"student_id": 2, "class_id": class_id},
+    ]
+    result = client.post("/enrollment/bulk", json=rows).json()
+    assert_adds_up(result)
+    assert (result["written"], result["skipped"], result["failed"]) == (2, 0, 1)
+    assert result["errors"] == [{"index": 1, "error": "duplicate of row 0"}]
+    assert client.get(f"/class/{class_id}").json()["enrolled_count"] == 2
+
+
+def test_already_enrolled_rows_are_skipped(client, class_id):
+    rows = [{"student_id": 1, "class_id": class_id}, {"student_id": 2, "class_id": class_id}]
+    client.post("/enrollment/bulk", json=rows[:1])
+    result = client.post("/enrollment/bulk", json=rows).json()
+    assert_adds_up(result)
+    assert (result["written"], result["skipped"], result["failed"]) == (1, 1, 0)
+    assert result["duplicates"] == [{"index": 0, "duplicate_of": None}]
+    assert client.get(f"/class/{class_id}").json()["enrolled_count"] == 2
+
+
+def new_classes(client, limits):
+    return [
+        client.post("/class", json={
+            "subject_id": 1, "teacher_id": 1, "student_limit": limit, "schedule": "Wed 8-10",
+        }).json()["id"]
+        for limit in limits
+    ]
+
+
+def queries(response) -> int:
+    return int(response.headers["server-timing"].split('desc="')[1].split()[0])
+
+
+def test_seats_are_taken_for_every_class_at_once(client):
+    class_ids = new_classes(client, [1, 2, 3, 4])
+    # three rows per class, plus one for a class that does not exist
+    rows = [{"student_id": student_id, "class_id": class_id} for class_id in class_ids for student_id in (1, 2, 3)]
+    rows.append({"student_id": 1, "class_id": 10 ** 9})
+    result = client.post("/enrollment/bulk", json=rows).json()
+    assert_adds_up(result)
+    assert (result["written"], result["failed"]) == (1 + 2 + 3 + 3, 2 + 1 + 0 + 0 + 1)
+    assert [client.get(f"/class/{class_id}").json()["enrolled_count"] for class_id in class_ids] == [1, 2, 3, 3]
+
+
+def test_bulk_enrollment_queries_do_not_grow_with_classes(client):
+    counts = []
+    for size in (2, 20):
+        class_ids = new_classes(client, [1] * size)
+        rows = [{"student_id": student_id, "class_id": class_id} for class_id in class_ids for student_id in (1, 2)]
+        counts.append(queries(client.post("/enrollment/bulk", json=rows)))
+    assert counts[0] == counts[1]
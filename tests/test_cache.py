@@ -0,0 +1,32 @@
+import re
+from typing import List
+
+from fastapi import FastAPI, Query
+from fastapi.testclient import TestClient
+
+from cache import LRUBackend, ResponseCacheMiddleware, cache_key
+
+
+def test_key_ignores_the_order_of_names():
+    assert cache_key("/a", b"b=1&a=2") == cache_key("/a", b"a=2&b=1") == "/a?a=2&b=1"
+
+
+def test_key_keeps_the_order_of_repeated_values():
+    assert cache_key("/a", b"p=90&p=50") == "/a?p=90&p=50"
+    assert cache_key("/a", b"p=90&p=50") != cache_key("/a", b"p=50&p=90")
+    assert cache_key("/a", b"p=90&x=1&p=50") == cache_key("/a", b"x=1&p=90&p=50")
+
+
+def test_repeated_parameters_are_cached_apart():
+    app = FastAPI()
+
+    @app.get("/echo")
+    def echo(p: List[int] = Query([])):
+        return p
+
+    app.add_middleware(ResponseCacheMiddleware, backend=LRUBackend(100, 60), routes=[(re.compile("^/echo$"), set())])
+    with TestClient(app) as client:
+        assert client.get("/echo?p=90&p=50").json() == [90, 50]
+        assert client.get("/echo?p=50&p=90").json() == [50, 90]
+        cached = client.get("/echo?p=90&p=50")
+        assert (cached.json(), cached.headers["x-cache"]) == ([90, 50], "HIT")
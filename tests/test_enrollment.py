@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+
+import httpx
+import pytest
+
+STUDENT_LIMIT = 5
+REQUESTS = 40
+
+
+def enroll_all(client, app, class_id: int, student_ids) -> Counter:
+    async def run() -> Counter:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*[
+                client.post("/enrollment", json={"student_id": student_id, "class_id": class_id})
+                for student_id in student_ids
+            ])
+        return Counter(response.status_code for response in responses)
+
+    # on the app's own loop: the async engine's pool is bound to it
+    return client.portal.call(run)
+
+
+@pytest.mark.parametrize("students", ["distinct", "repeated"])
+def test_concurrent_enrollments_never_exceed_the_limit(client, students):
+    from api import app
+
+    class_ = client.post("/class", json={
+        "subject_id": 1, "teacher_id": 1, "student_limit": STUDENT_LIMIT, "schedule": "Mon 8-10",
+    }).json()
+    if students == "distinct":
+        student_ids = range(1, REQUESTS + 1)
+    else:
+        # the same few students racing for their seat as well
+        student_ids = [1 + i % (STUDENT_LIMIT + 2) for i in range(REQUESTS)]
+
+    statuses = enroll_all(client, app, class_["id"], student_ids)
+
+    assert statuses == {200: STUDENT_LIMIT, 409: REQUESTS - STUDENT_LIMIT}
+    roster = client.get(f"/class/{class_['id']}/roster", params={"limit": 100}).json()
+    assert roster["pagination"]["total"] == STUDENT_LIMIT
+    assert roster["class"]["enrolled_count"] == STUDENT_LIMIT
+    assert client.get(f"/class/{class_['id']}").json()["enrolled_count"] == STUDENT_LIMIT
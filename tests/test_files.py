@@ -0,0 +1,64 @@
+import pytest
+from fastapi import HTTPException
+
+import files
+from files import BlobStore, parse_range
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-10", (1014, 1023)),
+    # a suffix longer than the file is the whole file
+    ("bytes=-5000", (0, 1023)),
+    # multiple ranges and malformed ones are ignored, the whole body is sent
+    ("bytes=0-9,20-29", None),
+    ("bytes=a-b", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0", "bytes=9-5"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(HTTPException) as raised:
+        parse_range(header, len(CONTENT))
+    assert raised.value.status_code == 416
+    assert raised.value.headers == {"Content-Range": "bytes */1024"}
+
+
+@pytest.fixture(params=["database", "blob store"])
+def stored(request, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(files, "blob_store", BlobStore(str(tmp_path)) if request.param == "blob store" else None)
+    submission_id = 3
+    assert client.put(f"/assignment_submission/{submission_id}/file", content=CONTENT).status_code == 200
+    return submission_id
+
+
+def test_ranges_are_served(client, stored):
+    url = f"/assignment_submission/{stored}/file"
+    whole = client.get(url)
+    assert (whole.status_code, whole.content) == (200, CONTENT)
+
+    suffix = client.get(url, headers={"Range": "bytes=-10"})
+    assert (suffix.status_code, suffix.content) == (206, CONTENT[-10:])
+    assert suffix.headers["Content-Range"] == "bytes 1014-1023/1024"
+    assert suffix.headers["Content-Length"] == "10"
+
+    assert client.get(url, headers={"Range": "bytes=1024-"}).status_code == 416
+    multiple = client.get(url, headers={"Range": "bytes=0-9,20-29"})
+    assert (multiple.status_code, multiple.content) == (200, CONTENT)
+
+
+def test_missing_blob_is_not_found(client, tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(files, "blob_store", store)
+    file_hash = client.put("/assignment_submission/4/file", content=CONTENT).json()["file_hash"]
+    store.path(file_hash).unlink()
+    response = client.get("/assignment_submission/4/file")
+    assert (response.status_code, response.json()["detail"]) == (404, "file content not found")
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+import grades
+from database import AsyncSessionLocal, engine
+from model import Assignment, AssignmentGrade, AssignmentSubmission, ClassGradeChange, ClassGrades
+
+
+def recompute(client, **kwargs) -> dict:
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await grades.recompute_class_grades(session, **kwargs)
+
+    return client.portal.call(run)
+
+
+def class_grades():
+    with Session(engine) as session:
+        return {(row.student_id, row.class_id): row.grade for row in session.exec(select(ClassGrades))}
+
+
+def graded_rows():
+    with Session(engine) as session:
+        return [tuple(row) for row in session.execute(grades.grade_rows())]
+
+
+@pytest.mark.skipif(grades.np is None, reason="needs numpy")
+def test_numpy_and_python_agree_on_the_test_data():
+    rows = graded_rows()
+    assert rows
+    assert sorted(grades._compute_numpy(rows)) == sorted(grades._compute_python(rows))
+
+
+@pytest.mark.skipif(grades.np is None, reason="needs numpy")
+def test_numpy_and_python_agree_on_resubmissions_and_zero_weights():
+    rng = random.Random(7)
+    rows = [
+        # (student, class, assignment, submission, weight, grade); assignments belong to class assignment % 5
+        (rng.randrange(20), assignment % 5, assignment, submission, rng.choice([0.0, 0.5, 1.0, 2.0]), rng.uniform(0, 10))
+        for submission, assignment in enumerate(rng.randrange(30) for _ in range(500))
+    ]
+    rng.shuffle(rows)
+    assert sorted(grades._compute_numpy(rows)) == sorted(grades._compute_python(rows))
+
+
+def test_incremental_matches_a_full_recompute(client):
+    recompute(client)
+    with Session(engine) as session:
+        # a class loses all of its assignments, a student their only grade in another class
+        emptied = session.exec(select(Assignment.class_id).join(AssignmentSubmission).join(AssignmentGrade)).first()
+        assignments = session.exec(select(Assignment.id).where(Assignment.class_id == emptied)).all()
+        grade_id, student_id, class_id = session.exec(
+            select(AssignmentGrade.id, AssignmentSubmission.student_id, Assignment.class_id)
+            .join(AssignmentSubmission, AssignmentSubmission.id == AssignmentGrade.submission_id)
+            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+            .where(Assignment.class_id != emptied)
+            .group_by(AssignmentSubmission.student_id, Assignment.class_id)
+            .having(func.count() == 1)
+        ).first()
+        changed = session.exec(select(AssignmentGrade).where(AssignmentGrade.id != grade_id)).first()
+    assert any(class_ == emptied for _, class_ in class_grades())
+    assert (student_id, class_id) in class_grades()
+
+    for assignment_id in assignments:
+        assert client.delete(f"/assignment/{assignment_id}").status_code == 200
+    assert client.delete(f"/assignment_grade/{grade_id}").status_code == 200
+    assert client.put(f"/assignment_grade/{changed.id}", json={
+        "submission_id": changed.submission_id, "grade": (changed.grade + 3) % 10,
+    }).status_code == 200
+
+    result = recompute(client, incremental=True)
+    incremental = class_grades()
+    assert result["removed"] > 1
+    assert not any(class_ == emptied for _, class_ in incremental)
+    assert (student_id, class_id) not in incremental
+    with Session(engine) as session:
+        assert session.exec(select(ClassGradeChange)).first() is None
+
+    recompute(client)
+    assert class_grades() == incremental
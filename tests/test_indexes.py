@@ -0,0 +1,44 @@
+from typing import List
+
+import pytest
+from sqlalchemy import select
+
+from assignments import assignment_feed
+from filters import SubmissionDateRange, student_filters
+from model import Assignment, AssignmentSubmission, Class, ClassGrades, Enrollment, Student
+
+
+def assert_uses(plan: List[str], table: str, index: str) -> None:
+    steps = [step for step in plan if step.split()[1:2] == [table]]
+    assert any(index in step for step in steps), plan
+    # a SCAN without an index reads the whole table
+    assert not any(step.startswith("SCAN") and "INDEX" not in step for step in steps), plan
+
+
+def test_roster_reads_enrollments_by_class(query_plan):
+    statement = select(Student).join(Enrollment, Enrollment.student_id == Student.id).where(Enrollment.class_id == 3)
+    assert_uses(query_plan(statement), "enrollment", "ix_enrollment_class_id_student_id")
+
+
+@pytest.mark.parametrize("status", [None, "graded"])
+def test_assignment_feed(query_plan, status):
+    plan = query_plan(assignment_feed(5, status))
+    assert_uses(plan, "assignment", "ix_assignment_class_id_due_date")
+    assert_uses(plan, "assignment_submission", "ix_assignment_submission_student_id_assignment_id")
+    assert_uses(plan, "assignment_grade", "ix_assignment_grade_submission_id")
+
+
+@pytest.mark.parametrize("statement, table, index", [
+    (select(Student).where(*student_filters(age=20)), "student", "ix_student_age"),
+    (select(Student).where(*student_filters(semester="3st")), "student", "ix_student_semester"),
+    (select(AssignmentSubmission).where(*SubmissionDateRange(year=2024, month=1, start=None, end=None).filters()),
+     "assignment_submission", "ix_assignment_submission_submission_date"),
+    (select(AssignmentSubmission).where(AssignmentSubmission.assignment_id == 1),
+     "assignment_submission", "ix_assignment_submission_assignment_id"),
+    (select(Class).where(Class.teacher_id == 1), "class", "ix_class_teacher_id"),
+    (select(Class).where(Class.subject_id == 1), "class", "ix_class_subject_id"),
+    (select(Assignment).where(Assignment.class_id == 1), "assignment", "ix_assignment_class_id_due_date"),
+    (select(ClassGrades).where(ClassGrades.class_id == 1), "class_grades", "ix_class_grades_class_id"),
+])
+def test_filters_use_their_index(query_plan, statement, table, index):
+    assert_uses(query_plan(statement), table, index)
@@ -0,0 +1,171 @@
+import asyncio
+import functools
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+import jobs
+from database import AsyncSessionLocal, engine
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobError, JobQueue, job_handler
+from model import Job
+
+blocked = {}
+
+
+@job_handler("test_echo")
+def echo(payload):
+    return payload
+
+
+@job_handler("test_flaky", max_attempts=2)
+async def flaky(payload):
+    raise ValueError("try again")
+
+
+@job_handler("test_broken")
+async def broken(payload):
+    raise JobError("bad payload")
+
+
+@job_handler("test_unserialisable")
+async def unserialisable(payload):
+    return object()
+
+
+@job_handler("test_blocked")
+async def block(payload):
+    blocked["started"].set()
+    await asyncio.Event().wait()
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    # jobs other tests left queued would be claimed first, and the blocked one never ends
+    with engine.begin() as connection:
+        connection.execute(delete(Job))
+    yield
+    with engine.begin() as connection:
+        connection.execute(delete(Job))
+
+
+@pytest.fixture
+def run(client):
+    def run(coroutine_function, *args, **kwargs):
+        return client.portal.call(functools.partial(coroutine_function, *args, **kwargs))
+
+    return run
+
+
+def queue() -> JobQueue:
+    return JobQueue(AsyncSessionLocal, workers=8, poll_interval=0.01, lease_seconds=30)
+
+
+async def submit(queue: JobQueue, name: str, payload=None, **values) -> int:
+    async with AsyncSessionLocal() as session:
+        job = await queue.submit(session, name, payload)
+        if values:
+            await session.execute(update(Job).where(Job.id == job.id).values(**values))
+            await session.commit()
+        return job.id
+
+
+async def load(job_id: int) -> Job:
+    async with AsyncSessionLocal() as session:
+        return await session.get(Job, job_id)
+
+
+async def claim_and_run(queue: JobQueue, job_id: int) -> Job:
+    await queue._fail_abandoned()
+    await queue._claim_and_start()
+    task = queue._running.get(job_id)
+    if task is not None:
+        await task
+    return await load(job_id)
+
+
+async def make_due(job_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(run_after=jobs._now()))
+        await session.commit()
+
+
+def test_claim_runs_a_job_once(run):
+    q = queue()
+    job_id = run(submit, q, "test_echo", {"x": 1})
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.result, job.attempts) == (SUCCEEDED, {"x": 1}, 1)
+    # finished jobs are not claimed again
+    assert run(claim_and_run, q, job_id).attempts == 1
+
+
+def test_failed_attempts_back_off_then_fail(run, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE", 10)
+    q = queue()
+    job_id = run(submit, q, "test_flaky")
+    before = jobs._now()
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.attempts, job.error) == (QUEUED, 1, "ValueError: try again")
+    # the first retry waits between half and all of the base delay
+    assert before + timedelta(seconds=5) <= job.run_after <= jobs._now() + timedelta(seconds=10)
+    # not due yet
+    assert run(claim_and_run, q, job_id).attempts == 1
+
+    run(make_due, job_id)
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.attempts) == (FAILED, 2)
+    assert job.finished_at is not None
+
+
+def test_job_error_is_not_retried(run):
+    q = queue()
+    job = run(claim_and_run, q, run(submit, q, "test_broken"))
+    assert (job.status, job.attempts, job.error) == (FAILED, 1, "JobError: bad payload")
+
+
+def test_unserialisable_result_does_not_leave_the_job_running(run):
+    q = queue()
+    job = run(claim_and_run, q, run(submit, q, "test_unserialisable"))
+    assert job.status == QUEUED
+    assert job.lease_until is None
+    assert job.error
+
+
+def test_expired_lease_is_reclaimed(run):
+    q = queue()
+    expired = jobs._now() - timedelta(seconds=1)
+    job_id = run(submit, q, "test_echo", "again", status=RUNNING, attempts=1, lease_until=expired)
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.attempts, job.result) == (SUCCEEDED, 2, "again")
+
+
+def test_expired_lease_on_the_last_attempt_fails(run):
+    q = queue()
+    expired = jobs._now() - timedelta(seconds=1)
+    job_id = run(submit, q, "test_echo", status=RUNNING, attempts=3, max_attempts=3, lease_until=expired)
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.attempts, job.error) == (FAILED, 3, "lease expired on the last attempt")
+
+
+def test_live_lease_is_not_reclaimed(run):
+    q = queue()
+    job_id = run(submit, q, "test_echo", status=RUNNING, attempts=1, lease_until=jobs._now() + timedelta(seconds=30))
+    job = run(claim_and_run, q, job_id)
+    assert (job.status, job.attempts) == (RUNNING, 1)
+
+
+def test_stop_requeues_running_jobs(run):
+    q = queue()
+
+    async def start_then_stop():
+        blocked["started"] = asyncio.Event()
+        job_id = await submit(q, "test_blocked")
+        q.start()
+        await asyncio.wait_for(blocked["started"].wait(), 5)
+        assert (await load(job_id)).status == RUNNING
+        await q.stop()
+        return await load(job_id)
+
+    job = run(start_then_stop)
+    # handed back without spending the interrupted attempt
+    assert (job.status, job.attempts, job.lease_until) == (QUEUED, 0, None)
@@ -0,0 +1,79 @@
+import base64
+import json
+
+import pytest
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from model import AssignmentSubmission, Student
+from pagination import MAX_PAGE_LIMIT, PageParams, SortKey, keyset_order, paginate
+from search import student_search
+
+MIXED_KEYS = [SortKey(Student.age, descending=True), SortKey(Student.name), SortKey(Student.id)]
+DATE_KEYS = [SortKey(AssignmentSubmission.submission_date), SortKey(AssignmentSubmission.id)]
+SEARCH, SEARCH_KEYS = student_search("sqlite", "an")
+
+CASES = {
+    "mixed directions": (select(Student).where(Student.id <= 300), MIXED_KEYS),
+    "date key": (select(AssignmentSubmission).where(AssignmentSubmission.id <= 300), DATE_KEYS),
+    "expression key": (SEARCH, SEARCH_KEYS),
+}
+
+
+def cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def walk(client):
+    async def pages(statement, keys, limit):
+        async with AsyncSessionLocal() as session:
+            expected = (await session.execute(statement.order_by(*keyset_order(keys)))).scalars().all()
+            forward, after = [], None
+            while True:
+                page = await paginate(session, statement, PageParams(page=0, limit=limit, after=after), keys)
+                forward.append(page)
+                after = page["pagination"]["next_cursor"]
+                if after is None:
+                    break
+            # from the last page back to the first through 'before'
+            backward, before = [], forward[-1]["pagination"]["prev_cursor"]
+            while before is not None:
+                page = await paginate(session, statement, PageParams(page=0, limit=limit, before=before), keys)
+                backward.insert(0, page)
+                before = page["pagination"]["prev_cursor"]
+            return [row.id for row in expected], forward, backward
+
+    return lambda statement, keys, limit: client.portal.call(pages, statement, keys, limit)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_cursors_walk_every_row_in_order(walk, case):
+    statement, keys = CASES[case]
+    expected, forward, backward = walk(statement, keys, 7)
+    assert len(expected) > 14
+    assert [row.id for page in forward for row in page["data"]] == expected
+    assert [[row.id for row in page["data"]] for page in backward] == [
+        [row.id for row in page["data"]] for page in forward[:-1]
+    ]
+    assert backward[0]["pagination"]["prev_cursor"] is None
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"limit": MAX_PAGE_LIMIT + 1}, {"page": -1}])
+def test_out_of_range_page_params_are_rejected(client, params):
+    assert client.get("/students_sorted", params=params).status_code == 422
+
+
+@pytest.mark.parametrize("after", [
+    "not a cursor",
+    cursor(["Ana"]),
+    cursor([{"a": 1}, 1]),
+    cursor([["Ana"], 1]),
+    cursor({"name": "Ana", "id": 1}),
+])
+def test_malformed_cursors_are_rejected(client, after):
+    assert client.get("/students_sorted", params={"after": after}).status_code == 400
+
+
+def test_date_cursor_is_rejected_when_not_a_date(client):
+    assert client.get("/teacher/1/dashboard", params={"after": cursor(["soon", 1])}).status_code == 400
@@ -0,0 +1,33 @@
+import pytest
+
+from model import ClassPublic, StudentPublic, SubjectPublic
+
+
+@pytest.mark.parametrize("path, schema", [
+    ("/student_page", StudentPublic),
+    ("/subject_page", SubjectPublic),
+    ("/class_page", ClassPublic),
+])
+def test_fast_pages_have_the_public_shape(client, path, schema):
+    rows = client.get(path, params={"limit": 20, "fast": True}).json()["data"]
+    assert rows
+    assert all(set(row) == set(schema.__fields__) for row in rows)
+
+
+def test_fast_student_page_embeds_the_classes(client):
+    rows = client.get("/student_page", params={"limit": 20, "fast": True}).json()["data"]
+    assert any(row["classes"] for row in rows)
+    for row in rows:
+        expected = client.get(f"/student/{row['id']}/classes", params={"limit": 100}).json()["data"]
+        assert sorted(class_["id"] for class_ in row["classes"]) == sorted(class_["id"] for class_ in expected)
+        assert all(set(class_) == set(ClassPublic.__fields__) for class_ in row["classes"])
+
+
+def test_fast_and_full_students_with_classes_agree(client):
+    fast = client.get("/students_with_classes", params={"limit": 20, "fast": True}).json()["data"]
+    full = client.get("/students_with_classes", params={"limit": 20}).json()["data"]
+
+    def normalized(rows):
+        return [dict(row, classes=sorted(row["classes"], key=lambda class_: class_["id"])) for row in rows]
+
+    assert normalized(fast) == normalized(full)
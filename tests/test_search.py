@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from search import student_search
+
+NAMES = ["Abel Quorvan", "Zed Quorvan", "Quorvan Zhu", "Quorvan Adams", "Mia Quorvanson"]
+
+
+@pytest.fixture(scope="module")
+def students(client):
+    return [
+        client.post("/student", json={"name": name, "age": 20, "semester": "1st", "entry_date": "2024-01-01"}).json()
+        for name in NAMES
+    ]
+
+
+def search(client, q, **params):
+    names, cursor = [], None
+    while True:
+        page = client.get("/student_search", params={"q": q, **params, **({"after": cursor} if cursor else {})}).json()
+        names += [student["name"] for student in page["data"]]
+        cursor = page["pagination"].get("next_cursor")
+        if not cursor:
+            return names
+
+
+@pytest.mark.parametrize("limit", [100, 2])
+def test_prefix_matches_rank_ahead_of_infix_matches(client, students, limit):
+    # infix names sort first alphabetically, the rank has to override that across pages too
+    assert search(client, "quorvan", limit=limit) == [
+        "Quorvan Adams", "Quorvan Zhu", "Abel Quorvan", "Mia Quorvanson", "Zed Quorvan",
+    ]
+
+
+@pytest.mark.skipif(sqlite3.sqlite_version_info < (3, 34), reason="FTS5 trigram needs SQLite 3.34")
+def test_search_uses_the_trigram_index(query_plan):
+    query, _ = student_search("sqlite", "quorvan")
+    plan = query_plan(query)
+    assert any(step.startswith("SCAN student_fts VIRTUAL TABLE INDEX") for step in plan), plan
+    # students are then fetched by rowid, never scanned
+    assert not any(step.startswith("SCAN student") and "student_fts" not in step for step in plan), plan
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import pytest
+
+from counts import count_cache
+from database import AsyncSessionLocal
+from instrumentation import count_queries
+from pagination import PageParams
+
+
+def queries_for(limit: int, fast: bool) -> int:
+    from api import get_students_with_classes
+
+    async def run() -> dict:
+        async with AsyncSessionLocal() as session:
+            return await get_students_with_classes(PageParams(page=0, limit=limit), fast=fast, session=session)
+
+    # a cached total would drop the count query from the second run
+    count_cache.clear()
+    with count_queries() as stats:
+        result = asyncio.run(run())
+    # the fast path hands back a rendered response
+    if not isinstance(result, dict):
+        result = json.loads(result.body)
+    assert len(result["data"]) == limit
+    return stats.queries
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_query_count_does_not_grow_with_the_page(fast):
+    one, many = queries_for(1, fast), queries_for(50, fast)
+    assert one == many
+    assert many <= 3
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_students_come_with_their_classes(client, fast):
+    body = client.get("/students_with_classes", params={"limit": 20, "fast": fast}).json()
+    enrollments = {}
+    for student in body["data"]:
+        roster = client.get(f"/student/{student['id']}/classes", params={"limit": 100}).json()["data"]
+        enrollments[student["id"]] = sorted(class_["id"] for class_ in roster)
+    assert {student["id"]: sorted(class_["id"] for class_ in student["classes"]) for student in body["data"]} == enrollments
+    assert all("subject" in class_ for student in body["data"] for class_ in student["classes"])
@@ -0,0 +1,69 @@
+from sqlmodel import Session, select
+
+from database import AsyncSessionLocal, engine
+from jobs import QUEUED, JobQueue
+from model import AssignmentGrade, AssignmentSubmission, Job, Student, StudentSummary
+from summary import SUMMARY_COLUMNS, summary_select
+
+
+def run_jobs(client) -> None:
+    queue = JobQueue(AsyncSessionLocal, workers=8)
+
+    async def drain():
+        while True:
+            await queue._claim_and_start()
+            if not queue._running:
+                return
+            for task in list(queue._running.values()):
+                await task
+
+    client.portal.call(drain)
+
+
+def queued_refreshes():
+    with Session(engine) as session:
+        return [
+            job.payload for job in
+            session.exec(select(Job).where(Job.type == "refresh_student_summaries", Job.status == QUEUED))
+        ]
+
+
+def assert_consistent(student_id: int) -> None:
+    with Session(engine) as session:
+        stored = session.get(StudentSummary, student_id)
+        live = session.execute(summary_select().where(Student.id == student_id)).one()
+    assert stored is not None
+    assert [getattr(stored, column) for column in SUMMARY_COLUMNS] == list(live)
+
+
+def test_summary_follows_enrollment_and_grade_writes(client):
+    run_jobs(client)
+    class_id = client.post("/class", json={
+        "subject_id": 2, "teacher_id": 1, "student_limit": 5, "schedule": "Thu 8-10",
+    }).json()["id"]
+    student_id = 11
+
+    assert client.post("/enrollment", json={"student_id": student_id, "class_id": class_id}).status_code == 200
+    assert {"table": "enrollment", "keys": [student_id]} in queued_refreshes()
+    run_jobs(client)
+    assert_consistent(student_id)
+    assert client.get(f"/student/{student_id}/summary").json()["class_count"] == (
+        client.get(f"/student/{student_id}/classes", params={"limit": 100}).json()["pagination"]["total"]
+    )
+
+    assert client.delete(f"/enrollment/{student_id}/{class_id}").status_code == 200
+    run_jobs(client)
+    assert_consistent(student_id)
+
+    with Session(engine) as session:
+        grade, graded_student = session.exec(
+            select(AssignmentGrade, AssignmentSubmission.student_id)
+            .join(AssignmentSubmission, AssignmentSubmission.id == AssignmentGrade.submission_id)
+        ).first()
+    assert client.put(f"/assignment_grade/{grade.id}", json={
+        "submission_id": grade.submission_id, "grade": (grade.grade + 5) % 10,
+    }).status_code == 200
+    assert {"table": "assignment_grade", "keys": [grade.submission_id]} in queued_refreshes()
+    run_jobs(client)
+    assert_consistent(graded_student)
+    assert not queued_refreshes()